@@ -1,132 +1,60 @@
-import yaml
 import os
 import importlib.util
-import utils
+import team_index
 from logger_config import logger
 
 
 def get_asset_name_list(context, values, logger):
-    kind = context.get("kind", "")
-    values = context.get("values", {})
+    kind = context.kind
     asset_name_list = []
     if kind == "Product":
-        asset_list = values.get("product", {}).get("assets", [])
-        check_list = values.get("assets", [])
-        for asset in asset_list:
-            for check_asset in check_list:
-                if asset.get("name") == check_asset.get("name"):
-                    name = asset.get("name", None).lower().replace(" ", "-")
-                    asset_name_list.append({"name": name})
+        for asset_name in context.node.asset_names:
+            if context.model.has_asset(asset_name):
+                name = asset_name.lower().replace(" ", "-")
+                asset_name_list.append({"name": name})
 
     return asset_name_list
 
 
 def get_parent_name(context, values, logger):
-    list_index = context.get("list_index") if context else None
-    keys = context.get("key_path").split(".") if context else None
-    kind = context.get("kind") if context else None
-    if (kind == "ReleaseTag" or kind == "AssetMapping" or kind == "AccessControlList") and keys[0] == "assets":
-        keys = keys[:2] + ["name"]
-    elif kind == "ProductPlan":
-        keys = keys[:1] + ["name"]
-    elif kind == "Quota":
-        keys = keys[:3] + ["name"]
-    elif kind == "ReleaseTag" and keys[0] == "product":
-        keys = keys[:1] + ["name"]
-
-    v = context.get("values") if context else {}
-    parent_name = None
-    for k in keys:
-        if isinstance(v, dict) and k in v:
-            v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            v = v[list_index.pop(0)]
-
-    return v.lower().replace(" ", "-")
+    # A quota belongs to its plan; release tags, asset mappings, access control lists and plans to their asset or product
+    node = context.node
+    parent = node.parent if context.kind == "Quota" else node.root()
+    return parent.name.lower().replace(" ", "-")
 
 
 def get_parent_kind(context, values, logger):
-    list_index = context.get("list_index") if context else None
-    keys = context.get("key_path").split(".") if context else None
-    kind = context.get("kind") if context else None
-    if context.get("kind") == "ReleaseTag" or context.get("kind") == "AssetMapping" or context.get("kind") == "AccessControlList":
-        return utils.KEY_TO_KIND_MAP.get(keys.pop(0))
+    kind = context.kind
+    if kind == "ReleaseTag" or kind == "AssetMapping" or kind == "AccessControlList":
+        return context.node.root().kind
 
 
-# Cache the team data for efficiency
-TEAM_DATA = None
-
-
-def _load_team_data(team_file_path):
-    global TEAM_DATA
-    if TEAM_DATA is None:
-        if not os.path.exists(team_file_path):
-            raise FileNotFoundError(f"Team data file not found: {team_file_path}")
-        with open(team_file_path, "r") as file:
-            TEAM_DATA = yaml.safe_load(file).get("teams", [])
-    return TEAM_DATA
+def _team_index():
+    # Built once per process; name/id lookups are hash lookups instead of scans over the team list
+    return team_index.get_team_index(team_index.TEAM_DATA_FILE)
 
 
 def lookup_teams_ids(context, values, logger):
-    kind = context.get("kind", "")
-    v = context.get("values", {})
-    team_file_path = os.path.join(os.path.dirname(__file__), "data/central-teams.yaml")
-    teams = _load_team_data(team_file_path)
-    keys = context.get("key_path").split(".") if context else None
-    list_index = context.get("list_index") if context else None
+    kind = context.kind
+    teams = _team_index()
     teams_ids_list = []
     if kind == "AccessControlList":
-        for k in keys:
-            if isinstance(v, dict) and k in v:
-                v = v[k]
-            elif isinstance(v, list) and k == "[]":
-                if list_index[0] == "*":
-                    v = v
-                else:
-                    v = v[list_index.pop(0)]
-        team_name_list = v
-        for team in team_name_list:
-            team_name = team.get("teamName", None)
-            for team in teams:
-                if team.get("name") == team_name:
-                    teams_ids_list.append({"id": team.get("id"), "type": "team"})
+        # The access control list is rendered once for the whole list ("*" index): the node is its asset
+        for entry in context.node.acl:
+            team_id = teams.id_for(entry.team_name)
+            if team_id is not None:
+                teams_ids_list.append({"id": team_id, "type": "team"})
 
     return teams_ids_list
 
 
 def lookup_team_id(context, values, logger):
-    list_index = context.get("list_index") if context else None
-    keys = context.get("key_path").split(".") if context else None
-    template_keys = context.get("template_key_path").split(".") if context else None
-    kind = context.get("kind") if context else None
-    v = context.get("values") if context else {}
-    team_name = None
-
-    if kind == "Asset" or kind == "Product":
-        keys.extend(["owner", "teamName"])
-    elif kind == "ProductPlan" or kind == "PublishedProduct":
-        keys = keys[:-2]
-        keys.extend(["owner", "teamName"])
-
-    for k in keys:
-        if isinstance(v, dict) and k in v:
-            v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            v = v[list_index.pop(0)]
-    team_name = v
-
-    team_file_path = os.path.join(os.path.dirname(__file__), "data/central-teams.yaml")
-    teams = _load_team_data(team_file_path)
-
-    for team in teams:
-        if team.get("name") == team_name:
-            return team.get("id")
-    return None
+    # Owner of the asset or product (plans and the published product are owned by their product)
+    return _team_index().id_for(context.node.root().owner_team)
 
 
 def generate_asset_name(context, values, logger):
-    context["kind"] = "Asset"
-    return generate_name(context, values)
+    return generate_name(context.with_kind("Asset"), values, logger)
 
 
 def format_name(context, values, logger, param):
@@ -145,26 +73,7 @@ def format_name(context, values, logger, param):
 
 # Helper function to generate names
 def generate_name(context, values, logger):
-    list_index = context.get("list_index") if context else None
-    keys = context.get("key_path").split(".") if context else None
-    v = context.get("values") if context else {}
-    kind = context.get("kind") if context else None
-
-    if kind == "Asset" or kind == "Product":
-        keys.extend(["name"])
-    elif kind == "AssetMapping":
-        keys.extend(["name", "services", "[]", "name"])
-    elif kind == "ProductPlan":
-        keys.extend(["name"])
-    elif kind == "Quota":
-        keys.extend(["name"])
-
-    for k in keys:
-        if isinstance(v, dict) and k in v:
-            v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            v = v[list_index.pop(0)]
-    return v.lower().replace(" ", "-")
+    return context.node.name.lower().replace(" ", "-")
 
 
 def access_control_list_subjects(context, values, logger):
@@ -174,52 +83,23 @@ def access_control_list_subjects(context, values, logger):
 
 
 def get_asset_resources(context, values, logger):
-    kind = context.get("kind", "")
-    v = context.get("values", {})
-    list_index = context.get("list_index") if context else None
-    keys = context.get("key_path").split(".") if context else None
+    kind = context.kind
     asset_resources = []
     if kind == "Quota":
-        keys.extend(["services"])
-    for k in keys:
-        if isinstance(v, dict) and k in v:
-            if k == "services":
-                asset_resources = v[k]
-            else:
-                v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            v = v[list_index.pop(0)]
+        asset_resources = context.node.services
 
     asset_name_list = []
-    for asset_service in asset_resources:
-        service = asset_service.get("name")
-        title = _find_asset_title(context.get("values", {}), service)
+    for service, asset in asset_resources:
+        title = context.model.service_title(service)
         if title:
             service = title
-        asset = asset_service.get("asset").lower().replace(" ", "-")
-        asset_name = f"{asset}/{service}"
+        asset_name = f"{asset.lower().replace(' ', '-')}/{service}"
 
         asset_name_list.append({"kind": "AssetResource", "name": asset_name})
 
     return asset_name_list
 
 
-def _find_asset_title(v, name, keys=None):
-    keys = "assets.[].services.[].title".split(".") if not keys else keys
-    for idx, k in enumerate(keys):
-        if isinstance(v, dict) and k in v:
-            if k == "title" and v.get("name") == name:
-                return v[k].lower().replace(" ", "-")
-            v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            for item in v:
-                title = _find_asset_title(item, name, keys[idx + 1 :])
-                if title:
-                    return title
-
-    return None
-
-
 # Dynamically load all helper functions from _helper_functions.py
 def load_helper_functions():
     helper_functions = {}
@@ -236,7 +116,6 @@ def load_helper_functions():
             helper_functions = {
                 name: func for name, func in vars(module).items() if callable(func) and (not name.startswith("__") and not name.startswith("_"))
             }
-            logger.info(f"Loaded helper functions: {', '.join(helper_functions.keys())}")
         except Exception as e:
             logger.error(f"Failed to load helper functions from {helper_file}: {e}")
     else:
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import base64
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import NewConnectionError
+
+from oauth import request_access_token, get_session_token
+
+BASE_URL = os.getenv("BASE_URL")
+# Seconds before expiry at which a cached token is refreshed
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "60"))
+# Lifetime assumed when neither the token response nor the token itself says when it expires
+DEFAULT_TOKEN_TTL = 300
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30"))
+POOL_SIZE = 16
+
+
+def _token_expiry(token_response, now):
+    if token_response.get("expires_in"):
+        return now + float(token_response["expires_in"])
+    # Fall back to the exp claim of a JWT access token
+    try:
+        payload = token_response.get("access_token", "").split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return now + DEFAULT_TOKEN_TTL
+
+
+def not_sent(error):
+    # The connection could not be opened, so the server never saw the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if isinstance(error, requests.ConnectionError) and error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class ApiClient:
+    # Central API client: one keep-alive connection pool and one cached access token for the whole process.
+    # Safe to share between threads.
+    def __init__(self, base_url=None, pool_size=POOL_SIZE, timeout=API_TIMEOUT, retries=3):
+        self.base_url = (base_url or BASE_URL or "").rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Idempotent requests are retried on connection errors and gateway failures; POST is never retried here.
+        # Callers that retry on their own pass retries=0, so the two layers do not multiply the attempts.
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD", "PUT", "DELETE"))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._access_token = None
+        self._expires_at = 0
+        self._session_token = None
+
+    def access_token(self):
+        with self._lock:
+            now = time.time()
+            if self._access_token is None or now >= self._expires_at - TOKEN_REFRESH_MARGIN:
+                # Requested while holding the lock: without a timeout, a hung token endpoint would stall every thread
+                token_response = request_access_token(self.session, timeout=self.timeout)
+                self._access_token = token_response.get("access_token")
+                self._expires_at = _token_expiry(token_response, now)
+                self._session_token = None
+            return self._access_token
+
+    def session_token(self):
+        # CSRF session tokens carry no expiry; they are renewed along with the access token and after a 401
+        access_token = self.access_token()
+        with self._lock:
+            if self._session_token is None:
+                self._session_token = get_session_token(access_token, self.session, timeout=self.timeout)
+            return self._session_token
+
+    def invalidate(self, access_token=None):
+        # Forget the cached tokens, unless another thread already replaced access_token
+        with self._lock:
+            if access_token is None or access_token == self._access_token:
+                self._access_token = None
+                self._session_token = None
+
+    def url(self, path):
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+    def request(self, method, path, **kwargs):
+        # Returns the response; a 401 refreshes the token and retries the request once
+        kwargs.setdefault("timeout", self.timeout)
+        extra_headers = kwargs.pop("headers", None) or {}
+        for attempt in range(2):
+            access_token = self.access_token()
+            headers = {"Authorization": f"Bearer {access_token}", **extra_headers}
+            response = self.session.request(method, self.url(path), headers=headers, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            self.invalidate(access_token)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+_CLIENTS = {}
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client(base_url=None, retries=3):
+    # Process-wide client per base URL (default BASE_URL) and retry count shared by the API scripts
+    with _CLIENT_LOCK:
+        client = _CLIENTS.get((base_url, retries))
+        if client is None:
+            client = _CLIENTS[(base_url, retries)] = ApiClient(base_url, retries=retries)
+        return client
@@ -0,0 +1,102 @@
+import re
+import sys
+import time
+import logging
+import argparse
+
+from colorama import Fore, Style
+
+import yaml_utils as y
+from logger_config import ColoredFormatter, PlainFormatter, DUMP
+
+# Compares the per-record cost of the console formatters on the messages map_yaml_2_yaml logs
+# (run from the repository root, like the other scripts):
+#   python scripts/bench_log_formatter.py -f accounts/axwy/dev/axwy-service-parameters.yaml
+
+
+def legacy_format(record):
+    # ColoredFormatter.format as it was before the single-pass tokenizer: four re.sub passes with closures
+    log_color = {"INFO": Fore.WHITE, "WARNING": Fore.YELLOW, "ERROR": Fore.RED, "DEBUG": Fore.BLUE}.get(record.levelname, Fore.WHITE)
+
+    def colorize_quotes(match):
+        return f"{Style.BRIGHT}{Fore.MAGENTA}{match.group(1)}{Style.RESET_ALL}{log_color}"
+
+    def colorize_exclamation(match):
+        return f"{Style.BRIGHT}{Fore.CYAN}{match.group(1)}{Style.RESET_ALL}{log_color}"
+
+    def colorize_astrik(match):
+        return f"{Style.BRIGHT}{Fore.BLUE}{match.group(1)}{Style.RESET_ALL}{log_color}"
+
+    def colorize_yaml(match):
+        formatted_lines = []
+        for line in match.group(1).splitlines():
+            if ":" in line:
+                key, value = line.split(":", 1)
+                formatted_lines.append(f"{Style.BRIGHT}{Fore.YELLOW}{key}{Style.RESET_ALL}:{Style.BRIGHT}{Fore.RED}{value}{Style.RESET_ALL}{log_color}")
+        return "\n".join(formatted_lines)
+
+    message = record.getMessage()
+    message = re.sub(r"'([^']*)'", colorize_quotes, message)
+    message = re.sub(r"!([^!]*)!", colorize_exclamation, message)
+    message = re.sub(r"\*([^!]*)\*", colorize_astrik, message)
+    message = re.sub(r"\?([^!]*)\?", colorize_yaml, message)
+
+    if message.startswith("##"):
+        return f"{log_color}{message[2:]}{Style.RESET_ALL}"
+    return f"{log_color}{record.levelname}: {message}{Style.RESET_ALL}"
+
+
+def make_record(level, msg, *args):
+    return logging.LogRecord("bench", level, __file__, 0, msg, args, None)
+
+
+def sample_records(values):
+    # The per-item messages dominate a run; every dump is preceded by many of them
+    records = [
+        make_record(logging.INFO, "*Processing* key '%s' with template: %s", "assets.[].services.[]", "./templates/asset-mapping.yaml"),
+        make_record(logging.INFO, "*Processing* key !%s! item !%d! in '%s'", "assets.[]", 1, "assets.[]"),
+        make_record(logging.INFO, "Updating '%s' in %s with value '%s'", "assets.[].services.[].name", "./templates/asset-mapping.yaml", "idcards"),
+        make_record(logging.INFO, "Calling function '%s' in %s with result '%s'", "generate_name()", "./templates/asset.yaml", "enterprise-idcards"),
+        make_record(logging.INFO, "*Finished* processing key !%s! item !%d! in '%s'", "assets.[]", 1, "assets.[]"),
+        make_record(logging.WARNING, "Placeholder '%s' in %s has no matching value", "product.categories", "./templates/product.yaml"),
+    ]
+    dump = make_record(DUMP, "##?%s?", y.format_yaml(values))
+    return records, dump
+
+
+def bench(format_record, records, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for record in records:
+            format_record(record)
+    return (time.perf_counter() - start) / (repeat * len(records))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the console log formatters.")
+    parser.add_argument("-f", "--filename", nargs="+", required=True, help="Parameter file(s) whose values are used for the YAML dump record.")
+    parser.add_argument("-n", "--repeat", type=int, default=2000, help="Times each record is formatted (default: 2000).")
+    args = parser.parse_args()
+
+    records, dump = sample_records(y.load_and_validate_yaml(args.filename))
+    formatters = {"legacy": legacy_format, "colored": ColoredFormatter().format, "plain": PlainFormatter().format}
+
+    print(f"{'formatter':<10} {'message us':>12} {'dump us':>12}")
+    results = {}
+    for name, format_record in formatters.items():
+        results[name] = (bench(format_record, records, args.repeat), bench(format_record, [dump], max(1, args.repeat // 20)))
+        print(f"{name:<10} {results[name][0] * 1e6:>12.2f} {results[name][1] * 1e6:>12.2f}")
+
+    legacy = results["legacy"]
+    for name in ("colored", "plain"):
+        print(f"{name} vs legacy: {legacy[0] / results[name][0]:.1f}x messages, {legacy[1] / results[name][1]:.1f}x dumps")
+
+    # Inline messages must highlight exactly as before
+    changed = [record.msg for record in records if legacy_format(record) != formatters["colored"](record)]
+    for msg in changed:
+        print(f"Output differs from legacy formatter for: {msg}")
+    return 1 if changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
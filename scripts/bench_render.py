@@ -0,0 +1,252 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from collections import OrderedDict
+
+import yaml_utils as y
+import team_index
+from output_sink import OutputSink
+from parse_cache import configure_parse_cache
+from profiler import enable_profiling, disable_profiling
+from logger_config import LOG_LEVELS, configure_logging
+import utils as u
+import map_yaml_2_yaml as m
+
+# Benchmarks the render pipeline on synthetic accounts shaped like accounts/<org>/<env>/*-service-parameters.yaml
+# against the baseline committed in tests/bench/ (run from the repository root):
+#   python scripts/bench_render.py --size small --size medium          # fails on a regression against the baseline
+#   python scripts/bench_render.py --size small --size medium --save-baseline   # after an intended change; commit it
+#   python scripts/bench_render.py --shape 200,10,16,4,20              # assets,services,plans,quotas,acl
+# Each shape is rendered --repeat times into memory (parse + merge, then walk_keys) with the render profiler
+# timing each template; peak memory is measured in a separate, unprofiled traced run.
+
+# assets per product, services per asset, plans, quotas per plan, ACL entries per asset
+SHAPES = {
+    "small": (2, 2, 4, 1, 2),
+    "medium": (20, 5, 8, 2, 5),
+    "large": (100, 10, 16, 4, 20),
+}
+ENVIRONMENTS = ("cnc-aws-iapp-dev-axwy-us-east-1", "cnc-aws-iapp-tst-axwy-us-east-2", "cnc-rco-iapp-dev-axwy", "cnc-aws-iapp-prd-axwy-us-west-2")
+# Services referenced by each quota
+QUOTA_SERVICES = 5
+DEFAULT_BASELINE = "./tests/bench/render-baseline.json"
+# Differences below these never count as regressions (timer and allocator noise on small shapes)
+MIN_TIME_DELTA = 0.005
+MIN_MEMORY_DELTA = 0.5
+
+
+def parse_shape(text):
+    if text in SHAPES:
+        return text, SHAPES[text]
+    values = tuple(int(part) for part in text.split(","))
+    if len(values) != 5 or min(values) < 0 or values[0] < 1:
+        raise argparse.ArgumentTypeError(f"Expected a size name ({', '.join(SHAPES)}) or assets,services,plans,quotas,acl: {text}")
+    return "x".join(map(str, values)), values
+
+
+def team_name(index):
+    return f"BENCH_TEAM_{index:04d}"
+
+
+def generate_teams(count):
+    return OrderedDict(teams=[OrderedDict(id=f"00000000-bench-4000-8000-{index:012d}", name=team_name(index)) for index in range(count)])
+
+
+def generate_params(shape, defaults):
+    # An account with one product over every asset; plans and quotas are cloned from the default plans
+    asset_count, service_count, plan_count, quota_count, acl_size = shape
+    assets, services = [], []
+    for a in range(asset_count):
+        name = f"Bench Asset {a:04d}"
+        asset_services = [
+            OrderedDict(name=f"bench-service-{a:04d}-{s:02d}", environment=ENVIRONMENTS[(a + s) % len(ENVIRONMENTS)], title=f"Bench API {a}.{s}")
+            for s in range(service_count)
+        ]
+        services.extend(OrderedDict(name=service["name"], asset=name) for service in asset_services)
+        assets.append(
+            OrderedDict(
+                name=name,
+                description=f"{name} Description",
+                activate=OrderedDict(releaseType="major"),
+                services=asset_services,
+                owner=OrderedDict(teamName=team_name(a % max(acl_size, 1))),
+                accessControlList=[OrderedDict(teamName=team_name((a + t) % max(acl_size, 1))) for t in range(acl_size)],
+                attributes=OrderedDict(appid="bench", dataclass="internal"),
+                tags=["appid:bench", "dataclass:internal"],
+            )
+        )
+
+    default_plans = defaults["product"]["plans"]
+    plans = []
+    for p in range(plan_count):
+        # The first plan and quota of each name override their default, the others are new
+        plan = copy.deepcopy(default_plans[p % len(default_plans)])
+        if p >= len(default_plans):
+            plan["name"] = f"{plan['name']} {p:02d}"
+        quota = plan["quotas"][0]
+        plan["quotas"] = []
+        for q in range(quota_count):
+            quota_services = [services[(p * quota_count + q + k) % len(services)] for k in range(min(QUOTA_SERVICES, len(services)))]
+            plan["quotas"].append(OrderedDict(quota, name=quota["name"] if q == 0 else f"{quota['name']} {q:02d}", services=quota_services))
+        plans.append(plan)
+
+    product = OrderedDict(
+        name="Bench Product",
+        description="Bench Product Description",
+        owner=OrderedDict(teamName=team_name(0)),
+        assets=[OrderedDict(name=asset["name"]) for asset in assets],
+        activate=OrderedDict(releaseType="major", marketplace=OrderedDict(name="Bench Marketplace")),
+        attributes=OrderedDict(appid="bench"),
+        tags=["appid:bench"],
+    )
+    if plans:
+        product["plans"] = plans
+    return OrderedDict(assets=assets, product=product)
+
+
+def write_catalog(folder, shape, defaults):
+    params_file = os.path.join(folder, "bench-service-parameters.yaml")
+    teams_file = os.path.join(folder, "central-teams.yaml")
+    with open(params_file, "w") as f:
+        y.ordered_dump(generate_params(shape, defaults), f, default_flow_style=False)
+    with open(teams_file, "w") as f:
+        y.ordered_dump(generate_teams(max(shape[4], 1)), f, default_flow_style=False)
+    return params_file, teams_file
+
+
+class CountingSink(OutputSink):
+    # Buffers like a real render but never writes the files
+    def __init__(self):
+        super().__init__(None)
+        self.documents = 0
+
+    def write(self, file_name, data):
+        self.documents += 1
+        return super().write(file_name, data)
+
+
+def render_once(params_file, defaults, templates):
+    # -> (documents, prepare seconds, walk seconds)
+    start = time.perf_counter()
+    values = m.merged_values([params_file], defaults)
+    prepared = time.perf_counter()
+    sink = CountingSink()
+    m.walk_keys(values, templates, sink)
+    finished = time.perf_counter()
+    return sink.documents, prepared - start, finished - prepared
+
+
+def measure(shape, defaults, templates, repeat):
+    with tempfile.TemporaryDirectory(prefix="bench-render-") as folder:
+        params_file, teams_file = write_catalog(folder, shape, defaults)
+        team_index.TEAM_DATA_FILE = teams_file
+
+        prepare_times, walk_times = [], []
+        profiler = enable_profiling()
+        for _ in range(repeat):
+            documents, prepare_time, walk_time = render_once(params_file, defaults, templates)
+            prepare_times.append(prepare_time)
+            walk_times.append(walk_time)
+        per_template = profiler.report()["templates"]
+        disable_profiling()
+
+        tracemalloc.start()
+        try:
+            render_once(params_file, defaults, templates)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    walk = statistics.median(walk_times)
+    return {
+        "shape": list(shape),
+        "documents": documents,
+        "prepare_s": statistics.median(prepare_times),
+        "walk_s": walk,
+        "documents_per_s": documents / walk if walk else 0.0,
+        "peak_mb": peak / 2**20,
+        "templates": {entry["template"]: {"count": entry["renders"] // repeat, "ms": entry["seconds"] / repeat * 1000} for entry in per_template},
+    }
+
+
+def regressions(results, baseline, tolerance, memory_tolerance):
+    # A shape without a baseline is a failure too, so the check never passes without comparing anything
+    found = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or previous.get("shape") != result["shape"]:
+            found.append(f"{name}: no baseline for shape {result['shape']}; store one with --save-baseline")
+            continue
+        if result["documents"] != previous["documents"]:
+            found.append(f"{name}: {result['documents']} document(s) rendered, baseline has {previous['documents']}")
+        for key, limit, floor in (("prepare_s", tolerance, MIN_TIME_DELTA), ("walk_s", tolerance, MIN_TIME_DELTA), ("peak_mb", memory_tolerance, MIN_MEMORY_DELTA)):
+            if result[key] > previous[key] * (1 + limit) and result[key] - previous[key] > floor:
+                found.append(f"{name}: {key} {result[key]:.4f} is {result[key] / previous[key] - 1:.0%} above the baseline {previous[key]:.4f}")
+    return found
+
+
+def print_results(results):
+    print(f"{'shape':<16} {'documents':>9} {'prepare ms':>11} {'walk ms':>9} {'docs/s':>9} {'peak MB':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<16} {result['documents']:>9} {result['prepare_s'] * 1000:>11.1f} {result['walk_s'] * 1000:>9.1f}"
+            f" {result['documents_per_s']:>9.0f} {result['peak_mb']:>8.1f}"
+        )
+    for name, result in results.items():
+        print(f"\n{name}: per template (per render)")
+        for key, stats in sorted(result["templates"].items(), key=lambda item: -item[1]["ms"]):
+            print(f"  {key:<36} {stats['count']:>6} x {stats['ms']:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark map_yaml_2_yaml.py rendering on synthetic catalogs.")
+    parser.add_argument("--size", dest="shapes", action="append", type=parse_shape, metavar="NAME", help=f"One of {', '.join(SHAPES)} (repeatable, default: small and medium)")
+    parser.add_argument("--shape", dest="shapes", action="append", type=parse_shape, metavar="A,S,P,Q,ACL", help="Custom shape: assets,services,plans,quotas,acl (repeatable)")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Timed renders per shape; the median is reported (default: 3)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"Baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline instead of comparing with it")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (default: 0.25)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="Allowed peak memory growth against the baseline (default: 0.10)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to FILE as JSON")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS), default="quiet", help="Log level while rendering (default: quiet)")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    # Parsing is part of what is measured
+    configure_parse_cache(False)
+
+    defaults = m.load_defaults()
+    templates = m.get_registry(m.TEMPLATES_FOLDER)
+    shapes = args.shapes or [parse_shape("small"), parse_shape("medium")]
+    results = {name: measure(shape, defaults, templates, args.repeat) for name, shape in shapes}
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        u.write_file_atomic(args.baseline, json.dumps(dict(baseline, **results), indent=2))
+        print(f"\nBaseline saved to '{args.baseline}'")
+        return 0
+
+    if not baseline:
+        print(f"\nNo baseline at '{args.baseline}'; store one with --save-baseline")
+        return 1
+    found = regressions(results, baseline, args.tolerance, args.memory_tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
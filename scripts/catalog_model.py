@@ -0,0 +1,197 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import ClassVar
+
+
+# Typed view of the merged values, built once per render: the product with its plans and quotas, the assets with
+# their services and access control lists. Every node knows where it comes from (keys and index vector, as in
+# RenderContext) and its parent, so helpers read the item being rendered as attributes instead of resolving paths.
+
+
+def format_resource_name(name):
+    return name.lower().replace(" ", "-")
+
+
+def _get(mapping, *keys):
+    for key in keys:
+        if not isinstance(mapping, dict):
+            return None
+        mapping = mapping.get(key)
+    return mapping
+
+
+def _items(values, key):
+    # (index, mapping) of a list of mappings; other entries keep their index but get no node
+    items = values.get(key) if isinstance(values, dict) else None
+    return [(index, item) for index, item in enumerate(items) if isinstance(item, dict)] if isinstance(items, list) else []
+
+
+class _Node:
+    __slots__ = ()
+    # Value paths (relative to the node) of the fields read from the values; recorded as the node's inputs
+    SOURCES: ClassVar[tuple] = (("name",),)
+
+    def root(self):
+        # The asset or product this node belongs to
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+
+@dataclass(slots=True, eq=False)
+class AclEntry(_Node):
+    SOURCES: ClassVar[tuple] = (("teamName",),)
+    team_name: str
+    keys: tuple
+    index: tuple
+    parent: "Asset" = field(default=None, repr=False)
+
+
+@dataclass(slots=True, eq=False)
+class Service(_Node):
+    name: str
+    keys: tuple
+    index: tuple
+    parent: "Asset" = field(default=None, repr=False)
+
+
+@dataclass(slots=True, eq=False)
+class Asset(_Node):
+    kind: ClassVar[str] = "Asset"
+    SOURCES: ClassVar[tuple] = (("name",), ("owner", "teamName"), ("accessControlList",))
+    name: str
+    owner_team: str
+    keys: tuple
+    index: tuple
+    acl: list = field(default_factory=list)
+    parent: None = field(default=None, repr=False)
+
+
+@dataclass(slots=True, eq=False)
+class Quota(_Node):
+    SOURCES: ClassVar[tuple] = (("name",), ("services",))
+    name: str
+    # (service name, asset name) of each service the quota applies to
+    services: list
+    keys: tuple
+    index: tuple
+    parent: "Plan" = field(default=None, repr=False)
+
+
+@dataclass(slots=True, eq=False)
+class Plan(_Node):
+    name: str
+    keys: tuple
+    index: tuple
+    parent: "Product" = field(default=None, repr=False)
+
+
+@dataclass(slots=True, eq=False)
+class Product(_Node):
+    kind: ClassVar[str] = "Product"
+    SOURCES: ClassVar[tuple] = (("name",), ("owner", "teamName"), ("assets",))
+    name: str
+    owner_team: str
+    # Names of the assets listed under product.assets
+    asset_names: list
+    keys: tuple
+    index: tuple
+    parent: None = field(default=None, repr=False)
+
+
+class CatalogModel:
+    # Nodes are registered under (keys, index vector) of the list item or mapping they are built from.
+    # The nodes do not track reads themselves: node_at records the SOURCES of the node and of its ancestors on
+    # the resolver (for incremental rebuilds), so helpers may read those fields but nothing else of the values.
+    # The catalog-wide queries (has_asset, service_title, environment_tags) are derived from "assets" and
+    # record a read of it.
+    def __init__(self, values, resolver=None):
+        self.resolver = resolver
+        self.nodes = {}
+        self._lookups = {}
+        self._asset_names = set()
+        self._titles = {}
+        environments = OrderedDict()
+
+        for a, item in _items(values, "assets"):
+            asset = self._add(Asset(item.get("name"), _get(item, "owner", "teamName"), ("assets", "[]"), (a,)))
+            self._asset_names.add(asset.name)
+            for s, service in _items(item, "services"):
+                name = service.get("name")
+                self._add(Service(name, asset.keys + ("services", "[]"), (a, s), asset))
+                # The first service of that name carrying a title names the resource
+                if service.get("title"):
+                    self._titles.setdefault(name, format_resource_name(service["title"]))
+                if "environment" in service:
+                    environments[service["environment"]] = None
+            for e, entry in _items(item, "accessControlList"):
+                asset.acl.append(self._add(AclEntry(entry.get("teamName"), asset.keys + ("accessControlList", "[]"), (a, e), asset)))
+
+        self._environment_tags = [tag for env in environments for tag in (f"env:{env}", f"region:{self.region(env)}")]
+
+        item = _get(values, "product")
+        if isinstance(item, dict):
+            asset_names = [entry.get("name") for _, entry in _items(item, "assets")]
+            product = self._add(Product(item.get("name"), _get(item, "owner", "teamName"), asset_names, ("product",), ()))
+            for p, plan_item in _items(item, "plans"):
+                plan = self._add(Plan(plan_item.get("name"), ("product", "plans", "[]"), (p,), product))
+                for q, quota in _items(plan_item, "quotas"):
+                    services = [(service.get("name"), service.get("asset")) for _, service in _items(quota, "services")]
+                    self._add(Quota(quota.get("name"), services, plan.keys + ("quotas", "[]"), (p, q), plan))
+
+    def _add(self, node):
+        self.nodes[(node.keys, node.index)] = node
+        return node
+
+    def _depends(self, node):
+        if self.resolver is not None:
+            for source in [node, *node.ancestors()]:
+                for path in source.SOURCES:
+                    self.resolver.get(source.keys + path, source.index)
+
+    def _depends_on_assets(self):
+        if self.resolver is not None:
+            self.resolver.get(("assets",))
+
+    def node_at(self, key_path, list_index=()):
+        # The node built from the item at key_path, or else the closest enclosing one
+        # (the asset for assets.[].activate or a whole assets.[].accessControlList); None outside the catalog
+        try:
+            node = self._lookups[(key_path, list_index)]
+        except KeyError:
+            keys, index, node = key_path, tuple(list_index), None
+            while keys and node is None:
+                node = self.nodes.get((keys, index))
+                if keys[-1] == "[]":
+                    index = index[:-1]
+                keys = keys[:-1]
+            self._lookups[(key_path, list_index)] = node
+        if node is not None:
+            self._depends(node)
+        return node
+
+    @staticmethod
+    def region(environment):
+        # Environments end with the region, e.g. cnc-aws-iapp-dev-axwy-us-east-1 -> us-east-1
+        return "-".join(environment.split("-")[-3:])
+
+    def has_asset(self, name):
+        self._depends_on_assets()
+        return name in self._asset_names
+
+    def service_title(self, name):
+        # Formatted title of the service, or None when no service of that name has one
+        self._depends_on_assets()
+        return self._titles.get(name)
+
+    def environment_tags(self):
+        # env:<environment> and region:<region> tags for every distinct service environment
+        self._depends_on_assets()
+        return list(self._environment_tags)
@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import central_plan as cp
+import central_resources as cr
+from api_client import get_client, not_sent
+from logger_config import logger
+
+# Applies the documents rendered by map_yaml_2_yaml.py (out_yaml/) to Central in dependency order:
+# each dependency level is pushed concurrently through one pooled, token-caching API client.
+# The delete command tears them down in reverse order.
+
+CENTRAL_URL = os.getenv("CENTRAL_URL", "https://apicentral.axway.com")
+ORG_ID = os.getenv("ORG_ID")
+# Responses worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Responses telling that the server did not act on the request, so even a POST can be sent again
+NOT_PROCESSED_STATUSES = (429, 503)
+# Written to the state of Assets, Products and plans before deleting them
+ARCHIVED_STATE = "archived"
+
+
+class ApplyError(RuntimeError):
+    pass
+
+
+def central_client():
+    # send() does the retrying, so the client's own adapter does not retry on top of it
+    return get_client(CENTRAL_URL, retries=0)
+
+
+def _headers():
+    return {"X-Axway-Tenant-Id": ORG_ID} if ORG_ID else None
+
+
+def send(client, method, url, body=None, retries=3, backoff=0.5, params=None, exists=None):
+    # Returns the response once it is not a throttling/server error, retrying those with exponential backoff.
+    # A POST may have created the resource even when it failed, so it is only sent again when the server did not
+    # act on it (never sent, 429, 503); otherwise exists() -> response or None is asked first, and without exists
+    # the failure is final.
+    unsure = False
+    for attempt in range(retries + 1):
+        if unsure:
+            response = exists()
+            if response is not None:
+                return response
+        try:
+            response = client.request(method, url, json=body, params=params, headers=_headers())
+        except requests.RequestException as e:
+            unsure = method == "POST" and not not_sent(e)
+            if attempt == retries or (unsure and exists is None):
+                raise ApplyError(f"{method} {url}: {e}") from e
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            unsure = method == "POST" and response.status_code not in NOT_PROCESSED_STATUSES
+            if unsure and exists is None:
+                return response
+        time.sleep(backoff * 2**attempt)
+
+
+def _check(response, method, url):
+    if response.status_code >= 300:
+        raise ApplyError(f"{method} {url}: {response.status_code} {response.text}")
+    return response
+
+
+def _subresource_body(resource, subresource, value):
+    body = {key: resource.doc[key] for key in ("group", "apiVersion", "kind", "name", "metadata") if key in resource.doc}
+    body[subresource] = value
+    return body
+
+
+def _existing(client, url, retries=3):
+    # The resource at url, or None when it is not there
+    response = send(client, "GET", url, retries=retries)
+    return response if response.status_code == 200 else None
+
+
+def write_subresources(client, resource, name, subresources, retries=3):
+    for subresource in subresources:
+        url = f"{resource.url(name)}/{subresource}"
+        _check(send(client, "PUT", url, _subresource_body(resource, subresource, resource.doc.get(subresource)), retries), "PUT", url)
+
+
+def apply_resource(client, resource, retries=3):
+    # Creates (or, when it already exists, replaces) the resource, then writes its subresources
+    name = resource.name
+    if resource.kind not in cr.SUBRESOURCE_ONLY_KINDS:
+        if resource.update:
+            _check(send(client, "PUT", resource.url(), resource.body(), retries), "PUT", resource.url())
+            action = "updated"
+        else:
+            # Resources named by the server (no name in the document) cannot be looked up after a failed POST
+            exists = (lambda: _existing(client, resource.url(name), retries)) if name else None
+            response = send(client, "POST", resource.collection_url(), resource.body(), retries, exists=exists)
+            if response.status_code == 409 and name:
+                response = send(client, "PUT", resource.url(), resource.body(), retries)
+                action = "updated"
+            else:
+                action = "created"
+            name = _check(response, "POST", resource.collection_url()).json().get("name") or name
+    else:
+        action = "updated"
+
+    write_subresources(client, resource, name, resource.subresources(), retries)
+    return action, name
+
+
+def run_levels(levels, operation, jobs=8, blockers=None):
+    # Runs operation(resource) for each level concurrently; resources whose dependencies (or blockers(resource))
+    # failed are skipped. Returns {resource: result}, {resource: error} and the skipped resources.
+    results, failed, skipped = {}, {}, []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for number, level in enumerate(levels, 1):
+            runnable = []
+            for resource in level:
+                if any(dep in failed or dep in skipped for dep in (blockers(resource) if blockers else resource.deps)):
+                    skipped.append(resource)
+                else:
+                    runnable.append(resource)
+            logger.info("*Level* !%d!/%d: %d resource(s)", number, len(levels), len(runnable))
+            futures = {resource: executor.submit(operation, resource) for resource in runnable}
+            for resource, future in futures.items():
+                try:
+                    results[resource] = future.result()
+                except ApplyError as e:
+                    failed[resource] = str(e)
+                    logger.error("Failed '%s': %s", resource.label, e)
+    return results, failed, skipped
+
+
+def apply_change(client, change, retries=3):
+    # Executes one planned create/update; no-ops cost no request
+    resource = change.resource
+    if change.action == cp.NOOP:
+        return "unchanged", resource.name
+    if change.action == cp.CREATE or not change.fields:
+        # Not in Central yet (a later document of a resource created by this run)
+        return apply_resource(client, resource, retries)
+    # An existing resource: a direct PUT when its own keys changed, then only the subresources that changed
+    owners = {field: next((s for s in resource.subresources() if field == s or field.startswith(f"{s}.")), None) for field in change.fields}
+    subresources = [s for s in resource.subresources() if s in owners.values()]
+    if resource.kind not in cr.SUBRESOURCE_ONLY_KINDS and None in owners.values():
+        _check(send(client, "PUT", resource.url(), resource.body(), retries), "PUT", resource.url())
+    write_subresources(client, resource, resource.name, subresources, retries)
+    return "updated", resource.name
+
+
+def delete_url(client, url, retries=3, backoff=0.5):
+    # A conflict (dependants still being removed) is retried like throttling; 404 means already gone
+    for attempt in range(retries + 1):
+        response = send(client, "DELETE", url, retries=retries)
+        if response.status_code == 404:
+            return "absent"
+        if response.status_code != 409 or attempt == retries:
+            break
+        time.sleep(backoff * 2**attempt)
+    _check(response, "DELETE", url)
+    return "deleted"
+
+
+def run_deletes(client, changes, jobs=8, retries=3):
+    # Deletes kind by kind (children first, see central_plan.DELETE_KIND_ORDER); returns the failed changes
+    failed = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for kind in dict.fromkeys(change.kind for change in changes):
+            batch = [change for change in changes if change.kind == kind]
+            futures = {change: executor.submit(delete_url, client, change.url, retries) for change in batch}
+            for change, future in futures.items():
+                try:
+                    future.result()
+                    logger.info("Deleted '%s'", change.label)
+                except ApplyError as e:
+                    failed.append(change)
+                    logger.error("Failed '%s': %s", change.label, e)
+    return failed
+
+
+def teardown_urls(client, resource, retries=3):
+    # URLs to delete for a document: PublishedProducts are named by the server, so they are looked up by product.
+    # ReleaseTags go with the Asset/Product they release and discovered instances are not ours to delete.
+    if resource.kind in cr.SUBRESOURCE_ONLY_KINDS or resource.kind == "ReleaseTag":
+        return []
+    if resource.kind == "PublishedProduct":
+        product = ((resource.doc.get("spec") or {}).get("product") or {}).get("name")
+        listing = cp.list_items(client, lambda *args, **kwargs: send(*args, retries=retries, **kwargs), resource.collection_url()) or {}
+        return [resource.url(name) for name, item in listing.items() if ((item.get("spec") or {}).get("product") or {}).get("name") == product]
+    return [resource.url()]
+
+
+def delete_resource(client, resource, retries=3):
+    # Archives (for kinds with a state) and deletes the resource; returns "deleted", "absent" or "kept"
+    urls = teardown_urls(client, resource, retries)
+    if not urls:
+        return "absent" if resource.kind == "PublishedProduct" else "kept"
+    action = "absent"
+    for url in urls:
+        if "state" in cr.SUBRESOURCES.get(resource.kind, ()):
+            response = send(client, "PUT", f"{url}/state", _subresource_body(resource, "state", ARCHIVED_STATE), retries)
+            if response.status_code == 404:
+                continue
+            _check(response, "PUT", f"{url}/state")
+        if delete_url(client, url, retries) == "deleted":
+            action = "deleted"
+    return action
+
+
+def remaining_resources(client, resources, jobs=8, retries=3):
+    # The resources still found in Central
+    fetch = lambda *args, **kwargs: send(*args, retries=retries, **kwargs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            resource: executor.submit(cp.get_item, client, fetch, resource.url())
+            for resource in resources
+            if resource.name and resource.kind not in cr.SUBRESOURCE_ONLY_KINDS
+        }
+        return [resource for resource, future in futures.items() if future.result() is not None]
+
+
+def teardown(out_folder, jobs=8, retries=3, dry_run=False):
+    # Deletes what the documents describe, dependants first: each level is archived and deleted concurrently
+    resources = cr.build_graph(cr.load_resources(out_folder))
+    dependants = cr.dependants(resources)
+    levels = cr.reverse_levels(resources)
+    if dry_run:
+        for number, level in enumerate(levels, 1):
+            logger.info("*Level* !%d!: %s", number, ", ".join(repr(resource) for resource in level))
+        return True
+
+    client = central_client()
+    results, failed, skipped = run_levels(levels, lambda resource: delete_resource(client, resource, retries), jobs, dependants.get)
+    for resource, action in results.items():
+        if action == "deleted":
+            logger.info("Deleted '%s'", resource.label)
+    for resource in skipped:
+        logger.warning("Skipped '%s': a dependant could not be deleted", resource.label)
+
+    remaining = remaining_resources(client, dependants, jobs, retries)
+    for resource in remaining:
+        logger.warning("Still in Central: '%s'", resource.label)
+    counts = [sum(1 for action in results.values() if action == state) for state in ("deleted", "absent")]
+    logger.info("*Deleted* !%d! resource(s), %d already gone, %d failed, %d skipped, %d remaining", *counts, len(failed), len(skipped), len(remaining))
+    return not failed and not skipped and not remaining
+
+
+def plan_changes(client, resources, jobs=8, retries=3):
+    state, collections, plans = cp.fetch_state(client, lambda *args, **kwargs: send(*args, retries=retries, **kwargs), resources, jobs)
+    return cp.plan(resources, state, collections, plans)
+
+
+def log_plan(changes, show_unchanged=False):
+    symbols = {cp.CREATE: "+", cp.UPDATE: "~", cp.NOOP: "=", cp.DELETE: "-"}
+    for change in changes:
+        if change.action != cp.NOOP or show_unchanged:
+            fields = f" ({', '.join(change.fields)})" if change.fields else ""
+            logger.info("%s %s '%s'%s", symbols[change.action], change.action, change.label, fields)
+    counts = cp.summary(changes)
+    logger.info("*Plan*: !%d! to create, !%d! to update, !%d! unchanged, !%d! to delete", counts[cp.CREATE], counts[cp.UPDATE], counts[cp.NOOP], counts[cp.DELETE])
+
+
+def plan(out_folder, jobs=8, retries=3, show_unchanged=False, json_file=None):
+    resources = cr.build_graph(cr.load_resources(out_folder))
+    changes = plan_changes(central_client(), resources, jobs, retries)
+    log_plan(changes, show_unchanged)
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump({"summary": cp.summary(changes), "changes": [change.as_dict() for change in changes]}, f, indent=2)
+    return changes
+
+
+def apply(out_folder, jobs=8, retries=3, dry_run=False, changed_only=False, prune=False):
+    resources = cr.build_graph(cr.load_resources(out_folder))
+    levels = cr.levels(resources)
+    if dry_run:
+        for number, level in enumerate(levels, 1):
+            logger.info("*Level* !%d!: %s", number, ", ".join(repr(resource) for resource in level))
+        return True
+
+    client = central_client()
+    deletes = []
+    if changed_only:
+        changes = plan_changes(client, resources, jobs, retries)
+        log_plan(changes)
+        by_resource = {change.resource: change for change in changes if change.resource is not None}
+        deletes = [change for change in changes if change.action == cp.DELETE]
+        operation = lambda resource: apply_change(client, by_resource[resource], retries)
+        # Levels without changes cost no requests
+        levels = [level for level in levels if any(by_resource[resource].action != cp.NOOP for resource in level)]
+    else:
+        operation = lambda resource: apply_resource(client, resource, retries)
+
+    results, failed, skipped = run_levels(levels, operation, jobs)
+    for resource, (action, name) in results.items():
+        if action != "unchanged":
+            logger.info("%s '%s'%s", action.capitalize(), resource.label, "" if resource.name else f" as '{name}'")
+    for resource in skipped:
+        logger.warning("Skipped '%s': a dependency failed", resource.label)
+
+    failed_deletes = []
+    if deletes and prune and not failed and not skipped:
+        failed_deletes = run_deletes(client, deletes, jobs, retries)
+    elif deletes:
+        logger.warning("%d resource(s) no longer generated were left in place%s", len(deletes), "" if prune else " (use --prune to delete them)")
+
+    changed = sum(1 for action, _ in results.values() if action != "unchanged")
+    logger.info("*Applied* !%d! change(s) for %d document(s), %d failed, %d skipped", changed, len(resources), len(failed), len(skipped))
+    return not failed and not skipped and not failed_deletes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the generated YAML documents to Central in dependency order, or tear them down.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser("apply", help="Create or update every document, one dependency level at a time.")
+    apply_parser.add_argument("-i", "--input", default="out_yaml", help="Folder with the generated YAML files (default: out_yaml)")
+    apply_parser.add_argument("-j", "--jobs", type=int, default=8, help="Concurrent requests per level (default: 8)")
+    apply_parser.add_argument("--retries", type=int, default=3, help="Retries on throttling, server or connection errors (default: 3)")
+    apply_parser.add_argument("--dry-run", action="store_true", help="Only print the dependency levels")
+    apply_parser.add_argument("--changed-only", action="store_true", help="Plan first and only apply the resources that differ from Central")
+    apply_parser.add_argument("--prune", action="store_true", help="With --changed-only, also delete resources no longer generated")
+    delete_parser = commands.add_parser("delete", help="Archive and delete every document, dependants first, one level at a time.")
+    delete_parser.add_argument("-i", "--input", default="out_yaml", help="Folder with the generated YAML files (default: out_yaml)")
+    delete_parser.add_argument("-j", "--jobs", type=int, default=8, help="Concurrent requests per level (default: 8)")
+    delete_parser.add_argument("--retries", type=int, default=3, help="Retries on throttling, conflicts, server or connection errors (default: 3)")
+    delete_parser.add_argument("--dry-run", action="store_true", help="Only print the teardown levels")
+    plan_parser = commands.add_parser("plan", help="Compare the documents with Central and print what apply --changed-only would do.")
+    plan_parser.add_argument("-i", "--input", default="out_yaml", help="Folder with the generated YAML files (default: out_yaml)")
+    plan_parser.add_argument("-j", "--jobs", type=int, default=8, help="Concurrent requests (default: 8)")
+    plan_parser.add_argument("--retries", type=int, default=3, help="Retries on throttling, server or connection errors (default: 3)")
+    plan_parser.add_argument("--show-unchanged", action="store_true", help="Also list the resources without changes")
+    plan_parser.add_argument("--json", metavar="FILE", help="Write the plan to FILE as JSON")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "plan":
+            plan(args.input, args.jobs, args.retries, args.show_unchanged, args.json)
+            return 0
+        if args.command == "delete":
+            return 0 if teardown(args.input, args.jobs, args.retries, args.dry_run) else 1
+        ok = apply(args.input, args.jobs, args.retries, args.dry_run, args.changed_only, args.prune)
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        logger.error(str(e))
+        return 1
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import central_resources as cr
+
+# Plans what applying out_yaml/ would change in Central: the current state of the resources named by the
+# documents is fetched concurrently (one listing per scoped collection, one GET per unscoped resource),
+# then every document is compared with it on the keys the document sets.
+
+CREATE, UPDATE, NOOP, DELETE = "create", "update", "no-op", "delete"
+PAGE_SIZE = 100
+# Server-managed keys that never take part in the comparison (the scope is part of the URL)
+IGNORED_KEYS = ("metadata",)
+# Deleting children before their parents; ReleaseTags are history and never deleted
+DELETE_KIND_ORDER = ("Quota", "Document", "AssetMapping", "AccessControlList", "ProductPlan")
+# Collections listed under every managed Asset/Product/ProductPlan, so that resources whose documents are
+# gone are found as well
+SCOPED_KINDS = {"Asset": ("AccessControlList", "AssetMapping"), "Product": ("Document", "AccessControlList"), "ProductPlan": ("Quota",)}
+
+
+class Change:
+    __slots__ = ("action", "resource", "kind", "label", "url", "fields")
+
+    def __init__(self, action, resource=None, kind=None, label=None, url=None, fields=()):
+        self.action = action
+        self.resource = resource
+        self.kind = kind or resource.kind
+        self.label = label or resource.label
+        self.url = url or (resource.url() if resource.name else resource.collection_url())
+        # Dotted paths of the keys that differ, for updates
+        self.fields = fields
+
+    def as_dict(self):
+        return {"action": self.action, "kind": self.kind, "resource": self.label, "url": self.url, "fields": list(self.fields)}
+
+
+def list_items(client, send, url, params=None):
+    # All items of a collection, page by page; None when the collection's scope does not exist
+    items, page = {}, 1
+    while True:
+        response = send(client, "GET", url, params=dict(params or {}, page=page, pageSize=PAGE_SIZE))
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 300:
+            raise RuntimeError(f"GET {url}: {response.status_code} {response.text}")
+        batch = response.json()
+        new_items = {item.get("name"): item for item in batch if item.get("name") not in items}
+        items.update(new_items)
+        if len(batch) < PAGE_SIZE or not new_items:
+            return items
+        page += 1
+
+
+def get_item(client, send, url):
+    response = send(client, "GET", url)
+    if response.status_code == 404:
+        return None
+    if response.status_code >= 300:
+        raise RuntimeError(f"GET {url}: {response.status_code} {response.text}")
+    return response.json()
+
+
+def fetch_state(client, send, resources, jobs=8):
+    # -> {resource url: current item or None}, {collection url: {name: item}}
+    collections, urls, products = set(), set(), set()
+    for resource in resources:
+        if resource.scope_kind and resource.kind not in cr.SUBRESOURCE_ONLY_KINDS:
+            collections.add(resource.collection_url())
+        elif resource.name:
+            urls.add(resource.url())
+        if not resource.scope_kind and resource.name:
+            for kind in SCOPED_KINDS.get(resource.kind, ()):
+                collections.add(f"{resource.url()}/{cr.plural(kind)}")
+        if resource.kind == "Product" and not resource.scope_kind:
+            products.add((resource.group, resource.api_version, resource.name))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        listings = {url: executor.submit(list_items, client, send, url) for url in collections}
+        # Plans reference their product instead of being scoped to it
+        plan_listings = {
+            name: executor.submit(list_items, client, send, f"{cr.API_PREFIX}/{group}/{version}/{cr.plural('ProductPlan')}", {"query": f'spec.product=="{name}"'})
+            for group, version, name in products
+        }
+        items = {url: executor.submit(get_item, client, send, url) for url in urls}
+        collections = {url: future.result() for url, future in listings.items()}
+        plans = {name: future.result() or {} for name, future in plan_listings.items()}
+        state = {url: future.result() for url, future in items.items()}
+
+    for url, listing in collections.items():
+        for name, item in (listing or {}).items():
+            state[f"{url}/{name}"] = item
+    return state, collections, plans
+
+
+def differences(desired, current, path=""):
+    # Dotted paths where current does not match desired; keys current has in addition are ignored
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return [path or "."]
+        fields = []
+        for key, value in desired.items():
+            if not path and key in IGNORED_KEYS:
+                continue
+            fields.extend(differences(value, current.get(key), f"{path}.{key}" if path else key))
+        return fields
+    if isinstance(desired, list):
+        if not isinstance(current, list) or len(desired) != len(current):
+            return [path]
+        fields = []
+        for index, (item, current_item) in enumerate(zip(desired, current)):
+            fields.extend(differences(item, current_item, f"{path}[{index}]"))
+        return fields
+    return [] if desired == current else [path]
+
+
+def plan(resources, state, collections, plans):
+    # One Change per document plus one delete per resource found under a managed scope but no longer generated
+    last = {}
+    for resource in resources:
+        last[resource.key] = resource
+
+    changes = {}
+    for resource in resources:
+        if resource.kind == "ReleaseTag":
+            continue
+        if resource.kind == "PublishedProduct":
+            product = resource.doc.get("spec", {}).get("product", {}).get("name")
+            listing = collections.get(resource.collection_url()) or {}
+            published = [item for item in listing.values() if (item.get("spec") or {}).get("product", {}).get("name") == product]
+            changes[resource] = Change(NOOP if published else CREATE, resource)
+            continue
+
+        current = state.get(resource.url())
+        if resource.kind in cr.SUBRESOURCE_ONLY_KINDS:
+            subresources = {key: resource.doc.get(key) for key in resource.subresources()}
+            fields = differences(subresources, current) if current is not None else list(subresources)
+            changes[resource] = Change(UPDATE if fields else NOOP, resource, fields=fields)
+        elif current is None:
+            changes[resource] = Change(UPDATE if resource.update else CREATE, resource)
+        elif resource is not last[resource.key]:
+            # Superseded by a later document of the same resource
+            changes[resource] = Change(NOOP, resource)
+        else:
+            fields = differences(resource.doc, current)
+            changes[resource] = Change(UPDATE if fields else NOOP, resource, fields=fields)
+
+    # A new release is only cut when something it releases changed
+    changed_roots = {resource.root for resource, change in changes.items() if change.action != NOOP}
+    for resource in resources:
+        if resource.kind == "ReleaseTag":
+            changes[resource] = Change(CREATE if (resource.scope_kind, resource.scope_name) in changed_roots else NOOP, resource)
+
+    desired = {resource.url() for resource in resources if resource.name}
+    deletes = []
+    for url, listing in collections.items():
+        for name, item in (listing or {}).items():
+            if f"{url}/{name}" not in desired and item.get("kind") not in cr.RELEASE_KINDS:
+                deletes.append(Change(DELETE, kind=item.get("kind"), label=f"{url.split('/', 4)[-1]}/{name}", url=f"{url}/{name}"))
+    for product, listing in plans.items():
+        for name, item in listing.items():
+            url = f"{cr.API_PREFIX}/{item.get('group', 'catalog')}/{item.get('apiVersion', 'v1alpha1')}/{cr.plural('ProductPlan')}/{name}"
+            if url not in desired and (item.get("spec") or {}).get("product") == product:
+                deletes.append(Change(DELETE, kind="ProductPlan", label=f"ProductPlan/{name}", url=url))
+    order = {kind: index for index, kind in enumerate(DELETE_KIND_ORDER)}
+    deletes.sort(key=lambda change: (order.get(change.kind, len(order)), change.url))
+    return [changes[resource] for resource in resources] + deletes
+
+
+def summary(changes):
+    counts = {action: 0 for action in (CREATE, UPDATE, NOOP, DELETE)}
+    for change in changes:
+        counts[change.action] += 1
+    return counts
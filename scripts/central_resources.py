@@ -0,0 +1,224 @@
+import os
+from glob import glob
+
+import yaml
+
+import yaml_utils as y
+
+# The generated out_yaml documents as Central API resources, and the order in which they can be created.
+#
+# A resource depends on its metadata.scope, on the resources it names (Product -> SupportContact and Assets,
+# ProductPlan -> Product, Quota -> the Asset mappings backing its AssetResources, PublishedProduct -> the
+# Product's ReleaseTags) and a ReleaseTag depends on everything under the Asset/Product it releases.
+# A resource rendered into several files (no-auto-release-Asset.yaml, then Asset.yaml) is created by the
+# first document and updated by the next ones, once everything scoped to it exists.
+
+API_PREFIX = "/apis"
+PLURALS = {"Category": "categories"}
+# Kinds whose documents only update subresources of resources that exist outside the catalog (discovered by agents)
+SUBRESOURCE_ONLY_KINDS = {"APIServiceInstance": ("lifecycle",)}
+# Top-level keys written through their subresource endpoint after the resource itself
+SUBRESOURCES = {"Asset": ("state",), "Product": ("state",), "ProductPlan": ("state",)}
+# Documents of these files are the first state of their resources
+INITIAL_FILE_PREFIX = "no-auto-release-"
+RELEASE_KINDS = ("ReleaseTag", "PublishedProduct")
+
+
+def plural(kind):
+    return PLURALS.get(kind, f"{kind.lower()}s")
+
+
+class Resource:
+    __slots__ = ("doc", "file", "index", "kind", "group", "api_version", "name", "scope_kind", "scope_name", "update", "deps", "root")
+
+    def __init__(self, doc, file, index):
+        self.doc = doc
+        self.file = file
+        self.index = index
+        self.kind = doc.get("kind")
+        self.group = doc.get("group")
+        self.api_version = doc.get("apiVersion")
+        self.name = doc.get("name")
+        scope = (doc.get("metadata") or {}).get("scope") or {}
+        self.scope_kind = scope.get("kind")
+        self.scope_name = scope.get("name")
+        # True for the second and later documents of the same resource
+        self.update = False
+        self.deps = set()
+        # (kind, name) of the Asset or Product this resource belongs to
+        self.root = None
+
+    @property
+    def key(self):
+        # Nameless resources (ReleaseTag, PublishedProduct) get their name from the server; each document is its own resource
+        name = self.name if self.name else f"{self.file}#{self.index}"
+        return (self.group, self.kind, self.scope_kind, self.scope_name, name)
+
+    def __repr__(self):
+        return f"{self.label} ({self.file}#{self.index})"
+
+    @property
+    def label(self):
+        scope = f"{self.scope_kind}/{self.scope_name}/" if self.scope_kind else ""
+        return f"{scope}{self.kind}/{self.name or '<generated>'}"
+
+    def collection_url(self):
+        base = f"{API_PREFIX}/{self.group}/{self.api_version}"
+        if self.scope_kind:
+            base = f"{base}/{plural(self.scope_kind)}/{self.scope_name}"
+        return f"{base}/{plural(self.kind)}"
+
+    def url(self, name=None):
+        return f"{self.collection_url()}/{name or self.name}"
+
+    def subresources(self):
+        return SUBRESOURCE_ONLY_KINDS.get(self.kind) or tuple(key for key in SUBRESOURCES.get(self.kind, ()) if key in self.doc)
+
+    def body(self):
+        # The document without the keys that are written through subresource endpoints
+        subresources = SUBRESOURCES.get(self.kind, ())
+        return {key: value for key, value in self.doc.items() if key not in subresources}
+
+    def references(self):
+        # (kind, name) of the unscoped resources this document names
+        spec = self.doc.get("spec") or {}
+        if self.kind == "Product":
+            refs = [("Asset", asset.get("name")) for asset in spec.get("assets") or []]
+            if spec.get("supportContact"):
+                refs.append(("SupportContact", spec["supportContact"]))
+            return refs
+        if self.kind == "ProductPlan" and spec.get("product"):
+            return [("Product", spec["product"])]
+        if self.kind == "PublishedProduct" and (spec.get("product") or {}).get("name"):
+            return [("Product", spec["product"]["name"])]
+        return []
+
+
+def document_files(out_folder):
+    # Initial-state files first, the rest by name
+    files = glob(os.path.join(out_folder, "*.yaml"))
+    return sorted(files, key=lambda path: (not os.path.basename(path).startswith(INITIAL_FILE_PREFIX), os.path.basename(path)))
+
+
+def load_resources(out_folder):
+    files = document_files(out_folder)
+    if not files:
+        raise FileNotFoundError(f"No YAML files found in: {out_folder}")
+    resources = []
+    for path in files:
+        with open(path, "r") as f:
+            for index, doc in enumerate(yaml.load_all(f, Loader=y.OrderedLoader)):
+                if doc:
+                    resources.append(Resource(doc, os.path.basename(path), index))
+    return resources
+
+
+def build_graph(resources):
+    # Fills resource.deps / resource.update / resource.root and returns the resources
+    by_key, by_name, scoped, by_instance = {}, {}, {}, {}
+    for resource in resources:
+        documents = by_key.setdefault(resource.key, [])
+        resource.update = bool(documents)
+        documents.append(resource)
+        if not resource.scope_kind and resource.name:
+            by_name.setdefault((resource.kind, resource.name), documents)
+        if resource.scope_kind:
+            scoped.setdefault((resource.scope_kind, resource.scope_name), []).append(resource)
+        if resource.kind == "AssetMapping" and (instance := ((resource.doc.get("spec") or {}).get("inputs") or {}).get("apiServiceInstance")):
+            by_instance.setdefault(instance, []).append(resource)
+
+    def created(kind, name):
+        documents = by_name.get((kind, name))
+        return [documents[0]] if documents else []
+
+    def final(kind, name):
+        documents = by_name.get((kind, name))
+        return [documents[-1]] if documents else []
+
+    def mappings(asset_name):
+        return [r for r in scoped.get(("Asset", asset_name), []) if r.kind == "AssetMapping"]
+
+    for resource in resources:
+        documents = by_key[resource.key]
+        position = documents.index(resource)
+        if position:
+            resource.deps.add(documents[position - 1])
+            # Later documents update the resource once everything scoped to it exists
+            if not resource.scope_kind:
+                resource.deps.update(r for r in scoped.get((resource.kind, resource.name), []) if r.kind not in RELEASE_KINDS)
+        if resource.scope_kind:
+            resource.deps.update(created(resource.scope_kind, resource.scope_name))
+        for kind, name in resource.references():
+            resource.deps.update(final(kind, name) if kind == "Asset" else created(kind, name))
+        if resource.kind == "Quota":
+            for asset_resource in (resource.doc.get("spec") or {}).get("resources") or []:
+                asset_name = (asset_resource.get("name") or "").split("/")[0]
+                resource.deps.update(created("Asset", asset_name) + mappings(asset_name))
+        elif resource.kind == "APIServiceInstance":
+            resource.deps.update(by_instance.get(f"management/{resource.scope_name}/{resource.name}", []))
+        elif resource.kind == "PublishedProduct":
+            for _, name in resource.references():
+                resource.deps.update(r for r in scoped.get(("Product", name), []) if r.kind == "ReleaseTag")
+
+    # A ReleaseTag waits for everything that belongs to the Asset/Product it releases
+    for resource in resources:
+        resource.root = _root(resource, by_name)
+    for resource in resources:
+        if resource.kind == "ReleaseTag" and resource.scope_kind in ("Asset", "Product"):
+            root = (resource.scope_kind, resource.scope_name)
+            resource.deps.update(r for r in resources if r.root == root and r.kind not in RELEASE_KINDS)
+        resource.deps.discard(resource)
+    return resources
+
+
+def _root(resource, by_name):
+    if resource.kind in ("Asset", "Product") and not resource.scope_kind:
+        return (resource.kind, resource.name)
+    if resource.kind == "ProductPlan":
+        return ("Product", (resource.doc.get("spec") or {}).get("product"))
+    if resource.scope_kind in ("Asset", "Product"):
+        return (resource.scope_kind, resource.scope_name)
+    if resource.scope_kind == "ProductPlan" and (plans := by_name.get(("ProductPlan", resource.scope_name))):
+        return _root(plans[0], by_name)
+    return None
+
+
+def _layers(remaining):
+    # remaining: {resource: set of resources that must come first}; consumed
+    result = []
+    while remaining:
+        level = [resource for resource, deps in remaining.items() if not deps]
+        if not level:
+            raise ValueError(f"Dependency cycle between: {', '.join(map(repr, remaining))}")
+        for resource in level:
+            del remaining[resource]
+        for deps in remaining.values():
+            deps.difference_update(level)
+        result.append(level)
+    return result
+
+
+def levels(resources):
+    # Dependency levels: every resource comes after all of its dependencies; resources of one level are independent
+    return _layers({resource: set(resource.deps) for resource in resources})
+
+
+def dependants(resources):
+    # {resource: resources that depend on it}, one entry per resource (its last document).
+    # A later document waiting for the resources scoped to it is a creation-order detail and is not reversed.
+    last = {}
+    for resource in resources:
+        last[resource.key] = resource
+    result = {resource: set() for resource in last.values()}
+    for resource in resources:
+        dependant = last[resource.key]
+        for dep in resource.deps:
+            target = last[dep.key]
+            if target is not dependant and (dep.scope_kind, dep.scope_name) != (resource.kind, resource.name):
+                result[target].add(dependant)
+    return result
+
+
+def reverse_levels(resources):
+    # Teardown levels: every resource comes after all of the resources that depend on it
+    return _layers({resource: set(deps) for resource, deps in dependants(resources).items()})
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import difflib
+import argparse
+
+import yaml_utils as y
+import team_index
+from output_sink import OutputSink
+from logger_config import configure_logging
+import map_yaml_2_yaml as m
+
+# Checks that the cached-scalar emitter behind ordered_dump writes exactly the bytes of the plain PyYAML emitter,
+# on every document rendered from the sample accounts, and that the rendered files match the committed golden
+# corpus in tests/golden/<org>/<env>/ (run from the repository root):
+#   python scripts/check_dump_golden.py
+#   python scripts/check_dump_golden.py --update      # after an intended output change; review the diff
+# The corpus is rendered with the team data in tests/golden/central-teams.yaml, so it does not depend on
+# scripts/data/central-teams.yaml.
+
+DEFAULT_GOLDEN = "./tests/golden"
+GOLDEN_TEAMS_FILE = "central-teams.yaml"
+
+
+class RecordingSink(OutputSink):
+    # Keeps every rendered document next to the buffered output
+    def __init__(self, output_folder):
+        super().__init__(output_folder)
+        self.documents = []
+
+    def write(self, file_name, data):
+        self.documents.append((file_name, data))
+        return super().write(file_name, data)
+
+
+def render_accounts(accounts_folder):
+    # -> {"<org>/<env>": RecordingSink}
+    defaults_dict = m.load_defaults(os.path.join(accounts_folder, os.path.basename(m.DEFAULTS_FILE)))
+    templates = m.get_registry(m.TEMPLATES_FOLDER)
+    sinks = {}
+    for org, env, account_folder in m.discover_accounts(accounts_folder):
+        sink = sinks[f"{org}/{env}"] = RecordingSink(os.path.join(org, env))
+        m.walk_keys(m.merged_values([account_folder], defaults_dict), templates, sink)
+    return sinks
+
+
+def timed_dumps(documents, cache_scalars):
+    start = time.perf_counter()
+    dumps = [y.ordered_dump(data, default_flow_style=False, cache_scalars=cache_scalars) for _, data in documents]
+    return dumps, time.perf_counter() - start
+
+
+def show_diff(expected, actual, name):
+    diff = difflib.unified_diff(expected.splitlines(True), actual.splitlines(True), f"expected/{name}", f"actual/{name}", n=1)
+    sys.stdout.writelines(list(diff)[:40])
+
+
+def compare_golden(sinks, golden_folder, update):
+    failures = 0
+    for account, sink in sinks.items():
+        for file_name, content in sink.files().items():
+            path = os.path.join(golden_folder, account, file_name)
+            if update:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(content)
+            elif not os.path.exists(path):
+                print(f"Missing golden file: {path}")
+                failures += 1
+            else:
+                with open(path, "r") as f:
+                    expected = f.read()
+                if expected != content:
+                    print(f"Differs from golden file: {path}")
+                    show_diff(expected, content, f"{account}/{file_name}")
+                    failures += 1
+        # Golden files the render no longer produces
+        account_folder = os.path.join(golden_folder, account)
+        for file_name in sorted(set(os.listdir(account_folder)) - set(sink.files())) if os.path.isdir(account_folder) else []:
+            if update:
+                os.remove(os.path.join(account_folder, file_name))
+            else:
+                print(f"Golden file not rendered any more: {os.path.join(account_folder, file_name)}")
+                failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that ordered_dump output is byte-identical to the plain PyYAML emitter.")
+    parser.add_argument("--accounts", default="./accounts", help="Accounts folder to render (default: ./accounts)")
+    parser.add_argument("--golden", metavar="FOLDER", default=DEFAULT_GOLDEN, help=f"Golden corpus to compare the rendered files with (default: {DEFAULT_GOLDEN})")
+    parser.add_argument("--no-golden", action="store_true", help="Only compare the cached emitter with the plain one")
+    parser.add_argument("--update", action="store_true", help="(Re)write the golden corpus instead of comparing with it")
+    args = parser.parse_args()
+    configure_logging("quiet")
+    golden = None if args.no_golden else args.golden
+    if golden:
+        team_index.TEAM_DATA_FILE = os.path.join(golden, GOLDEN_TEAMS_FILE)
+
+    sinks = render_accounts(args.accounts)
+    documents = [(f"{account}/{file_name}", data) for account, sink in sinks.items() for file_name, data in sink.documents]
+    reference, reference_time = timed_dumps(documents, cache_scalars=False)
+    # Cold caches: the first dump of each icon pays for the plain emitter once
+    y.clear_scalar_caches()
+    cached, cached_time = timed_dumps(documents, cache_scalars=True)
+
+    failures = 0
+    for (name, _), expected, actual in zip(documents, reference, cached):
+        if expected != actual:
+            print(f"Cached emitter output differs for a document of {name}")
+            show_diff(expected, actual, name)
+            failures += 1
+    print(f"{len(documents)} document(s) from {len(sinks)} account(s): reference {reference_time * 1000:.1f} ms, cached {cached_time * 1000:.1f} ms")
+
+    if golden:
+        failures += compare_golden(sinks, golden, args.update)
+        if args.update:
+            print(f"Golden corpus written to '{golden}'")
+    print("OK" if not failures else f"{failures} difference(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,7 @@
 import os
-import requests
 import sys
 import argparse
-from oauth import get_access_token, get_session_token
+from api_client import get_client
 from yaml_utils import load_and_validate_yaml
 from fetch_team_ids import fetch_team_ids
 
@@ -10,7 +9,6 @@ from fetch_team_ids import fetch_team_ids
 BASE_URL = os.getenv("BASE_URL")
 ORG_ID = os.getenv("ORG_ID")
 IDP_ID = os.getenv("IDP_ID")
-API_TOKEN = "your_api_token"  # Keep this manually set or load it securely
 
 # Validate that required environment variables are set
 if not BASE_URL or not ORG_ID or not IDP_ID:
@@ -20,8 +18,7 @@ if not BASE_URL or not ORG_ID or not IDP_ID:
 
 # Function to get the current IDP data
 def get_idp():
-    url = f"{BASE_URL}/org/{ORG_ID}/idp/{IDP_ID}"
-    response = requests.get(url, headers=HEADERS)
+    response = get_client().get(f"/org/{ORG_ID}/idp/{IDP_ID}")
     if response.status_code == 200:
         return response.json()
     else:
@@ -82,8 +79,7 @@ def update_idp(new_team):
     transformed_idp_data["mappedTeams"].append(new_team)
 
     # Prepare PUT request
-    url = f"{BASE_URL}/org/{ORG_ID}/idp/{IDP_ID}"
-    response = requests.put(url, headers=HEADERS, json=transformed_idp_data)
+    response = get_client().put(f"/org/{ORG_ID}/idp/{IDP_ID}", json=transformed_idp_data)
 
     if response.status_code == 200:
         print("IDP updated successfully!")
@@ -91,15 +87,6 @@ def update_idp(new_team):
         print(f"Error updating IDP: {response.status_code}, {response.text}")
 
 
-access_token = get_access_token()
-
-
-API_TOKEN = access_token
-
-# Headers for authentication
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}", "Content-Type": "application/json"}
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create a team using a YAML configuration file.")
     parser.add_argument("--yaml-file", required=True, help="Path to the YAML configuration file")
@@ -1,22 +1,29 @@
-import requests
 import os
+import sys
+import time
 import argparse
-from oauth import get_access_token, get_session_token
-from yaml_utils import load_and_validate_yaml
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-BASE_URL = os.getenv("BASE_URL")
-ORG_GUID = os.getenv("ORG_GUID")
+import requests
 
+from api_client import get_client, not_sent
+from fetch_team_ids import fetch_team_ids
+from team_index import normalize_team_name
+from yaml_utils import load_and_validate_yaml, DuplicateKeyError
+
+ORG_GUID = os.getenv("ORG_GUID")
+# Responses that say the team was not created, so the POST can be sent again as is
+RETRY_STATUSES = (429, 503)
 
-def create_team(data):
-    access_token = get_access_token()
-    # API_TOKEN = get_session_token(access_token)
-    API_TOKEN = access_token
 
+def _post_team(data):
     payload = {"name": data.get("name"), "desc": data.get("description"), "org_guid": ORG_GUID, "tags": data.get("tags", [])}
+    return get_client().post("/team", json=payload)
 
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    response = requests.post(f"{BASE_URL}/team", json=payload, headers=headers)
+
+def create_team(data):
+    response = _post_team(data)
 
     if response.status_code == 200:
         return response.json().get("result")
@@ -24,11 +31,124 @@ def create_team(data):
         raise RuntimeError(f"Failed to create Team: {response.status_code} {response.text}")
 
 
+def find_team_files(paths):
+    # Directories are searched recursively for *.yaml files
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob(os.path.join(path, "**", "*.yaml"), recursive=True)))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"Invalid path or no YAML files found: {path}")
+    return files
+
+
+def load_teams(files):
+    # [(file, team)] for every file with a "team" key; a team defined in several files is created once
+    teams, seen = [], {}
+    for file_path in files:
+        team = load_and_validate_yaml([file_path]).get("team")
+        if not team or not team.get("name"):
+            print(f"Skipping {file_path}: no team definition")
+            continue
+        name = normalize_team_name(team["name"])
+        if name in seen:
+            print(f"Skipping {file_path}: team '{team['name']}' is already defined in {seen[name]}")
+            continue
+        seen[name] = file_path
+        teams.append((file_path, team))
+    return teams
+
+
+def _team_exists(name):
+    wanted = normalize_team_name(name)
+    return any(normalize_team_name(team.get("name")) == wanted for team in fetch_team_ids() or [])
+
+
+def create_team_with_retries(team, retries=3, backoff=1.0):
+    # Returns ("created", result) or ("exists", None); raises once retries are exhausted.
+    # POST is not idempotent: it is sent again as is only when the team cannot have been created (connect errors,
+    # 429/503). After any other failure (read timeout, 5xx, ...) the teams are listed first, and a team that now
+    # exists is not created a second time.
+    unsure = False
+    for attempt in range(retries + 1):
+        if unsure and _team_exists(team.get("name")):
+            return "exists", None
+        try:
+            response = _post_team(team)
+        except requests.RequestException as e:
+            error = str(e)
+            unsure = not not_sent(e)
+        else:
+            if response.status_code == 200:
+                return "created", response.json().get("result")
+            if response.status_code == 409:
+                return "exists", None
+            error = f"{response.status_code} {response.text}"
+            if response.status_code < 500 and response.status_code not in RETRY_STATUSES:
+                break
+            unsure = response.status_code not in RETRY_STATUSES
+        if attempt < retries:
+            time.sleep(backoff * 2**attempt)
+    raise RuntimeError(f"Failed to create Team '{team.get('name')}': {error}")
+
+
+def create_teams(teams, workers=8, retries=3):
+    # One team listing decides what already exists; the rest is created on a bounded thread pool
+    existing = {normalize_team_name(team.get("name")) for team in fetch_team_ids() or []}
+    summary = {"created": [], "skipped": [], "failed": {}}
+    pending = []
+    for file_path, team in teams:
+        if normalize_team_name(team["name"]) in existing:
+            summary["skipped"].append(team["name"])
+        else:
+            pending.append(team)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(create_team_with_retries, team, retries): team["name"] for team in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                status, _ = future.result()
+            except Exception as e:
+                # Includes failures of the team listing done between retries
+                summary["failed"][name] = str(e)
+                continue
+            summary["created" if status == "created" else "skipped"].append(name)
+    return summary
+
+
+def print_summary(summary):
+    print(f"Teams created: {len(summary['created'])}, already existing: {len(summary['skipped'])}, failed: {len(summary['failed'])}")
+    for name in sorted(summary["created"]):
+        print(f"  created  {name}")
+    for name in sorted(summary["skipped"]):
+        print(f"  exists   {name}")
+    for name, error in sorted(summary["failed"].items()):
+        print(f"  FAILED   {name}: {error}")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create a team using a YAML configuration file.")
-    parser.add_argument("--yaml-file", required=True, help="Path to the YAML configuration file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--yaml-file", help="Path to the YAML configuration file")
+    source.add_argument("--bulk", nargs="+", metavar="PATH", help="Team YAML files or directories; creates every team that does not exist yet")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="Concurrent create requests in --bulk mode (default: 8)")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per team on throttling, server or connection errors; teams are listed again before a retry that could duplicate one (default: 3)")
     args = parser.parse_args()
 
-    data = load_and_validate_yaml([args.yaml_file])
-    result = create_team(data.get("team"))
-    print(result)
+    if args.yaml_file:
+        data = load_and_validate_yaml([args.yaml_file])
+        result = create_team(data.get("team"))
+        print(result)
+        sys.exit(0)
+
+    try:
+        teams = load_teams(find_team_files(args.bulk))
+    except (DuplicateKeyError, FileNotFoundError) as e:
+        print(e)
+        sys.exit(1)
+    summary = create_teams(teams, workers=args.jobs, retries=args.retries)
+    print_summary(summary)
+    sys.exit(1 if summary["failed"] else 0)
@@ -1,17 +1,11 @@
-import requests
 import os
-from oauth import get_access_token, get_session_token
+from api_client import get_client
 from yaml_utils import ordered_dump
 
-BASE_URL = os.getenv("BASE_URL")
-
 
 def fetch_team_ids():
-    access_token = get_access_token()
-    # API_TOKEN = get_session_token(access_token)
-    API_TOKEN = access_token
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    response = requests.get(f"{BASE_URL}/team", headers=headers)
+    # The shared client reuses its cached token and pooled connection
+    response = get_client().get("/team")
 
     if response.status_code == 200:
         return response.json().get("result")
@@ -1,25 +1,50 @@
-import requests
 import os
-from oauth import get_access_token, get_session_token
+from api_client import get_client
 from yaml_utils import ordered_dump
 import logging
 
-BASE_URL = os.getenv("BASE_URL")
 
+# Teams requested per page
+TEAM_PAGE_SIZE = int(os.getenv("TEAM_PAGE_SIZE", "500"))
 
-def fetch_team_ids():
-    access_token = get_access_token()
-    # API_TOKEN = get_session_token(access_token)
-    API_TOKEN = access_token
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    response = requests.get(f"{BASE_URL}/team", headers=headers)
 
+def fetch_team_page(offset, limit, headers=None):
+    # The shared client reuses its cached token and pooled connection
+    return get_client().get("/team", params={"offset": offset, "limit": limit}, headers=headers)
+
+
+def _page_result(response):
     if response.status_code == 200:
-        return response.json().get("result")
+        return response.json().get("result") or []
     else:
         raise RuntimeError(f"Failed to fetch team IDs: {response.status_code} {response.text}")
 
 
+def iter_teams(page_size=TEAM_PAGE_SIZE, first_response=None, on_page=None):
+    # Yields teams page by page; first_response is an already fetched first page (offset 0),
+    # on_page(offset, response) is called for every page fetched
+    offset, seen = 0, set()
+    response = first_response
+    while True:
+        if response is None:
+            response = fetch_team_page(offset, page_size)
+        page = _page_result(response)
+        if on_page:
+            on_page(offset, response)
+        new_teams = [team for team in page if team.get("guid") not in seen]
+        seen.update(team.get("guid") for team in new_teams)
+        yield from new_teams
+        # A short page is the last one; a server ignoring offset/limit returns everything (or the same page) every time
+        if len(page) != page_size or not new_teams:
+            return
+        offset += len(page)
+        response = None
+
+
+def fetch_team_ids():
+    return list(iter_teams())
+
+
 if __name__ == "__main__":
     current_dir = os.getcwd()
     team_list = fetch_team_ids()
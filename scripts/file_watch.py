@@ -0,0 +1,44 @@
+import os
+import time
+from glob import glob
+
+from logger_config import logger
+
+
+class PollingWatcher:
+    # Detects changes to the files matching glob patterns by comparing (mtime, size) between polls:
+    # plain os.stat calls, so it works on any filesystem without notification APIs
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._stats = self._scan()
+
+    def _scan(self):
+        stats = {}
+        for pattern in self.patterns:
+            for path in glob(pattern):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stats[os.path.normpath(path)] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def changes(self):
+        # Paths added, modified or removed since the previous call
+        stats = self._scan()
+        changed = {path for path in stats.keys() | self._stats.keys() if stats.get(path) != self._stats.get(path)}
+        self._stats = stats
+        return changed
+
+
+def poll(interval, check):
+    # Calls check() every interval seconds until interrupted (Ctrl-C); a failing check is logged, the next one still runs
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                check()
+            except Exception as e:
+                logger.exception(f"Watch check failed: {e}")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,96 @@
+import os
+import json
+import base64
+import hashlib
+import mimetypes
+
+import utils as u
+from logger_config import logger
+
+
+class IconCache:
+    # Encodes each icon image once, keyed by the SHA-256 of its content. Encodings and the
+    # path -> (mtime, size, digest) index are persisted under cache_dir so later runs skip reading the image;
+    # a persisted encoding is only used when its decoded content has that digest.
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._index = None
+        self._encoded = {}
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            if self.cache_dir and os.path.exists(index_file := os.path.join(self.cache_dir, "index.json")):
+                try:
+                    with open(index_file, "r") as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable icon cache index '{index_file}': {e}")
+        return self._index
+
+    def _persist(self, digest, data_uri):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            u.write_file_atomic(os.path.join(self.cache_dir, f"{digest}.txt"), data_uri)
+            u.write_file_atomic(os.path.join(self.cache_dir, "index.json"), json.dumps(self._index, indent=2, sort_keys=True))
+        except OSError as e:
+            logger.warning(f"Could not persist icon cache to '{self.cache_dir}': {e}")
+
+    def _read_persisted(self, digest):
+        if not self.cache_dir or not os.path.exists(path := os.path.join(self.cache_dir, f"{digest}.txt")):
+            return None
+        try:
+            with open(path, "r") as f:
+                data_uri = f.read()
+            content = base64.b64decode(data_uri.partition(";base64,")[2], validate=True)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable icon cache entry '{path}': {e}")
+            return None
+        if hashlib.sha256(content).hexdigest() != digest:
+            logger.warning(f"Ignoring icon cache entry '{path}': its content does not match the digest")
+            return None
+        return data_uri
+
+    def digest(self, image_path):
+        path = os.path.abspath(image_path)
+        stat = os.stat(path)
+        entry = self._load_index().get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["digest"], None
+
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        self._index[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "digest": digest}
+        return digest, content
+
+    def data_uri(self, image_path):
+        digest, content = self.digest(image_path)
+        if (data_uri := self._encoded.get(digest)) is not None:
+            return data_uri
+
+        if content is None:
+            data_uri = self._read_persisted(digest)
+        if data_uri is None:
+            if content is None:
+                with open(image_path, "rb") as f:
+                    content = f.read()
+            mime_type = mimetypes.guess_type(image_path)[0] or "image/png"
+            data_uri = f"data:{mime_type};base64,{base64.b64encode(content).decode('utf-8')}"
+            self._persist(digest, data_uri)
+
+        self._encoded[digest] = data_uri
+        return data_uri
+
+
+_ICON_CACHE = None
+
+
+def get_icon_cache():
+    # Process-wide cache persisted under the per-user cache folder (see utils.user_cache_dir)
+    global _ICON_CACHE
+    if _ICON_CACHE is None:
+        _ICON_CACHE = IconCache(u.user_cache_dir("icons"))
+    return _ICON_CACHE
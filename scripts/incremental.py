@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+
+import utils as u
+from output_sink import OutputSink
+from logger_config import logger
+
+MANIFEST_FILE = ".render-manifest.json"
+MANIFEST_VERSION = 1
+
+# Modules whose code decides what a rendered document looks like or whether a previous one is reused
+RENDER_MODULES = (
+    "_helper_functions.py",
+    "catalog_model.py",
+    "icon_cache.py",
+    "incremental.py",
+    "map_yaml_2_yaml.py",
+    "output_sink.py",
+    "parse_cache.py",
+    "render_context.py",
+    "team_index.py",
+    "template_compiler.py",
+    "template_registry.py",
+    "utils.py",
+    "value_paths.py",
+    "yaml_utils.py",
+)
+
+
+def digest_bytes(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def digest_value(value):
+    # Key order is kept: it decides the order of the rendered output
+    return digest_bytes(json.dumps(value, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+def digest_file(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return digest_bytes(f.read())
+
+
+def helper_version():
+    scripts_folder = os.path.dirname(os.path.abspath(__file__))
+    return digest_value([digest_file(os.path.join(scripts_folder, module)) for module in RENDER_MODULES])
+
+
+def document_id(template_key, list_index):
+    return f"{template_key}@{'.'.join(str(i) for i in list_index)}"
+
+
+def digest_reads(resolver, reads):
+    # reads: [(keys, index vector), ...] as recorded by ValueResolver.record_reads
+    return digest_value([[list(keys), list(index), resolver.get(tuple(keys), tuple(index))] for keys, index in reads])
+
+
+class IncrementalSink(OutputSink):
+    # OutputSink that reuses documents whose inputs did not change since the previous run (per the manifest
+    # stored in the output folder) and leaves output files whose content did not change untouched
+    incremental = True
+
+    def __init__(self, output_folder, global_inputs):
+        super().__init__(output_folder)
+        self.global_inputs = global_inputs
+        self.manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+        self._previous_documents = {}
+        self._previous_files = {}
+        self._previous_content = {}
+        self._documents = {}
+        self._capture = None
+        self.reused = 0
+        self.rendered = 0
+
+        previous = self._load_manifest()
+        if previous.get("version") == MANIFEST_VERSION:
+            self._previous_files = previous.get("files", {})
+            # A change to defaults, team data or the render code invalidates every document
+            if previous.get("global") == global_inputs:
+                self._previous_documents = previous.get("documents", {})
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable render manifest '{self.manifest_path}': {e}")
+            return {}
+
+    def _previous_file(self, file_name):
+        # Content of an output file from the previous run, provided it is unchanged since then
+        if file_name not in self._previous_content:
+            content = None
+            path = os.path.join(self.output_folder, file_name)
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    content = f.read()
+                if digest_bytes(content.encode("utf-8")) != self._previous_files.get(file_name):
+                    content = None
+            self._previous_content[file_name] = content
+        return self._previous_content[file_name]
+
+    def write(self, file_name, data):
+        start, end = super().write(file_name, data)
+        if self._capture is not None:
+            self._capture.append([file_name, start, end])
+        return start, end
+
+    def reuse(self, doc_id, inputs, resolver):
+        previous = self._previous_documents.get(doc_id)
+        if not previous or previous["inputs"] != inputs:
+            return False
+        if digest_reads(resolver, previous["reads"]) != previous["reads_digest"]:
+            return False
+
+        texts = []
+        for file_name, start, end in previous["outputs"]:
+            if (content := self._previous_file(file_name)) is None:
+                return False
+            texts.append((file_name, content[start:end]))
+
+        outputs = [[file_name, *self.write_text(file_name, text)] for file_name, text in texts]
+        self._documents[doc_id] = dict(previous, outputs=outputs)
+        self.reused += 1
+        return True
+
+    @contextmanager
+    def capture(self, doc_id, inputs, resolver):
+        # Record what the document reads from the values tree and where its text lands in the output files
+        self._capture = outputs = []
+        try:
+            with resolver.record_reads() as reads:
+                yield
+        finally:
+            self._capture = None
+        reads = sorted([list(keys), list(index)] for keys, index in reads)
+        self._documents[doc_id] = {"inputs": inputs, "reads": reads, "reads_digest": digest_reads(resolver, reads), "outputs": outputs}
+        self.rendered += 1
+
+    def flush(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        files = {}
+        for file_name, content in self.files().items():
+            files[file_name] = digest = digest_bytes(content.encode("utf-8"))
+            path = os.path.join(self.output_folder, file_name)
+            if self._previous_files.get(file_name) == digest and digest_file(path) == digest:
+                continue
+            u.write_file_atomic(path, content)
+
+        # Like the rmtree of a full render: any other file in the folder is stale, whether the previous
+        # incremental run wrote it or an earlier full render did
+        for entry in os.scandir(self.output_folder):
+            if entry.is_file() and entry.name not in files and entry.name != MANIFEST_FILE:
+                os.remove(entry.path)
+
+        manifest = {"version": MANIFEST_VERSION, "global": self.global_inputs, "files": files, "documents": self._documents}
+        u.write_file_atomic(self.manifest_path, json.dumps(manifest, separators=(",", ":")))
+        self._streams.clear()
@@ -1,69 +1,180 @@
 from colorama import init, Fore, Style
+from datetime import datetime, timezone
 import logging
+import json
+import os
 import re
 
+# Level of the large YAML dumps (values trees, dict values). Shown by default ("verbose");
+# "info" and "quiet" skip them without formatting anything.
+DUMP = 15
+logging.addLevelName(DUMP, "DUMP")
+
+LOG_LEVELS = {"debug": logging.DEBUG, "verbose": DUMP, "info": logging.INFO, "quiet": logging.WARNING}
+DEFAULT_LOG_LEVEL = os.environ.get("MARKETPLACE_LOG_LEVEL", "verbose")
+
+
+class Lazy:
+    # Log argument computed only when a handler formats the record, e.g.
+    # logger.log(DUMP, "##?%s?", Lazy(y.format_yaml, data)); the result is kept for the other handlers
+    __slots__ = ("func", "args", "_text")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = str(self.func(*self.args))
+        return self._text
+
+
+# One pass over the inline highlight markup: 'quoted', !exclaimed!, *starred*, ?yaml?
+_MARKUP = re.compile(r"'([^']*)'|!([^!]*)!|\*([^*]*)\*|\?([^!]*)\?")
+_INLINE_MARKUP = re.compile(r"!([^!]*)!|\*([^*]*)\*")
+_LEVEL_COLORS = {"INFO": Fore.WHITE, "WARNING": Fore.YELLOW, "ERROR": Fore.RED, "DEBUG": Fore.BLUE}
+
+
+def _level_name(record):
+    # DUMP records (the headers of the YAML dumps) keep the "INFO" prefix they were printed with before the level existed
+    return "INFO" if record.levelno == DUMP else record.levelname
+
+
+def _is_yaml_block(message):
+    return len(message) > 1 and message[0] == "?" and message[-1] == "?"
+
 
 class ColoredFormatter(logging.Formatter):
+    # Highlights the markup without the marks: 'quoted' text magenta, !...! cyan, *...* blue,
+    # ?yaml? dumps with yellow keys and red values. "##" messages are printed without the level name.
     def __init__(self):
+        super().__init__()
         init(autoreset=True)
+        self._highlights = {}
 
-    def format(self, record):
-        log_color = {"INFO": Fore.WHITE, "WARNING": Fore.YELLOW, "ERROR": Fore.RED, "DEBUG": Fore.BLUE}.get(record.levelname, Fore.WHITE)
-
-        # Colorize single-quoted text (without quotes)
-        def colorize_quotes(match):
-            inner_text = match.group(1)
-            return f"{Style.BRIGHT}{Fore.MAGENTA}{inner_text}{Style.RESET_ALL}{log_color}"
-
-        # Colorize exclamation-mark-wrapped text (without marks)
-        def colorize_exclamation(match):
-            inner_text = match.group(1)
-            return f"{Style.BRIGHT}{Fore.CYAN}{inner_text}{Style.RESET_ALL}{log_color}"
-
-        # Colorize astrik-wrapped text (without marks)
-        def colorize_astrik(match):
-            inner_text = match.group(1)
-            return f"{Style.BRIGHT}{Fore.BLUE}{inner_text}{Style.RESET_ALL}{log_color}"
-
-        # Colorize question-mark-wrapped text (without marks)
-        def colorize_questionmark(match):
-            inner_text = match.group(1)
-            return f"{Style.BRIGHT}{Fore.YELLOW}{inner_text}{Style.RESET_ALL}{log_color}"
-
-        def colorize_yaml(match):
-            yaml_str = match.group(1)
-            formatted_lines = []
-            for line in yaml_str.splitlines():
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    formatted_line = f"{Style.BRIGHT}{Fore.YELLOW}{key}{Style.RESET_ALL}:{Style.BRIGHT}{Fore.RED}{value}{Style.RESET_ALL}{log_color}"
-                    formatted_lines.append(formatted_line)
-            return "\n".join(formatted_lines)
+    def _highlight(self, log_color):
+        # Replacement strings per level color, built once
+        highlights = self._highlights.get(log_color)
+        if highlights is None:
+            highlights = self._highlights[log_color] = (
+                f"{Style.BRIGHT}{Fore.MAGENTA}{{}}{Style.RESET_ALL}{log_color}",
+                f"{Style.BRIGHT}{Fore.CYAN}{{}}{Style.RESET_ALL}{log_color}",
+                f"{Style.BRIGHT}{Fore.BLUE}{{}}{Style.RESET_ALL}{log_color}",
+                f"{Style.BRIGHT}{Fore.YELLOW}{{}}{Style.RESET_ALL}:{Style.BRIGHT}{Fore.RED}{{}}{Style.RESET_ALL}{log_color}",
+            )
+        return highlights
 
+    def _colorize_yaml(self, yaml_str, key_value):
+        lines = []
+        for line in yaml_str.splitlines():
+            key, colon, value = line.partition(":")
+            lines.append(key_value.format(key, value) if colon else line)
+        return "\n".join(lines)
+
+    def format(self, record):
+        log_color = _LEVEL_COLORS.get(record.levelname, Fore.WHITE)
+        highlights = self._highlight(log_color)
         message = record.getMessage()
-        # Apply single-quote highlighting: '...' -> inner text in magenta
-        message = re.sub(r"'([^']*)'", colorize_quotes, message)
-        # Apply exclamation-mark highlighting: !...! -> inner text in cyan
-        message = re.sub(r"!([^!]*)!", colorize_exclamation, message)
-        # Apply astrik highlighting: *...* -> inner text in blue
-        message = re.sub(r"\*([^!]*)\*", colorize_astrik, message)
-        # Apply question-mark highlighting: ?...? -> inner text in yellow
-        message = re.sub(r"\?([^!]*)\?", colorize_yaml, message)
+        prefixed = not message.startswith("##")
+        if not prefixed:
+            message = message[2:]
+
+        if _is_yaml_block(message):
+            # Dumps are colorized line by line without scanning them for inline markup
+            message = self._colorize_yaml(message[1:-1], highlights[3])
+        else:
+
+            def colorize(match):
+                group = match.lastindex
+                if group == 4:
+                    return self._colorize_yaml(match.group(4), highlights[3])
+                return highlights[group - 1].format(match.group(group))
 
+            message = _MARKUP.sub(colorize, message)
+
+        if prefixed:
+            return f"{log_color}{_level_name(record)}: {message}{Style.RESET_ALL}"
+        return f"{log_color}{message}{Style.RESET_ALL}"
+
+
+def strip_markup(message):
+    # Message without the !...!, *...* and ?...? marks; quotes are kept
+    if _is_yaml_block(message):
+        return message[1:-1]
+    if "!" not in message and "*" not in message:
+        return message
+    return _INLINE_MARKUP.sub(lambda match: match.group(match.lastindex), message)
+
+
+def plain_message(record):
+    # Message without the highlight markup (##, !...!, *...*, ?...?) understood by ColoredFormatter
+    message = record.getMessage()
+    return strip_markup(message[2:] if message.startswith("##") else message)
+
+
+class PlainFormatter(logging.Formatter):
+    # Used when stderr is not a terminal (CI, redirected output): no colors and no markup
+    def format(self, record):
+        message = record.getMessage()
         if message.startswith("##"):
-            message = message[2:]  # Remove prefix
-            return f"{log_color}{message}{Style.RESET_ALL}"
+            return strip_markup(message[2:])
+        message = f"{_level_name(record)}: {strip_markup(message)}"
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        return message
 
-        return f"{log_color}{record.levelname}: {message}{Style.RESET_ALL}"
+
+class JsonLinesFormatter(logging.Formatter):
+    # One JSON object per record, for CI log collectors
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "message": plain_message(record),
+            "module": record.module,
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
 
 # Setup logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVELS.get(DEFAULT_LOG_LEVEL, DUMP))
 if logger.hasHandlers():
     logger.handlers.clear()
 
 # Add a console handler
 handler = logging.StreamHandler()
-handler.setFormatter(ColoredFormatter())
+handler.setFormatter(ColoredFormatter() if handler.stream.isatty() else PlainFormatter())
 logger.addHandler(handler)
+
+# (level name, JSON-lines file) last applied by configure_logging
+_SETTINGS = (DEFAULT_LOG_LEVEL, None)
+_json_handler = None
+
+
+def configure_logging(level=None, json_log=None):
+    global _SETTINGS, _json_handler
+    source = "" if level else " (from MARKETPLACE_LOG_LEVEL)"
+    level = level or DEFAULT_LOG_LEVEL
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level '{level}'{source}, expected one of: {', '.join(LOG_LEVELS)}")
+    logger.setLevel(LOG_LEVELS[level])
+
+    if _json_handler is not None:
+        logger.removeHandler(_json_handler)
+        _json_handler.close()
+        _json_handler = None
+    if json_log:
+        _json_handler = logging.FileHandler(json_log, encoding="utf-8")
+        _json_handler.setFormatter(JsonLinesFormatter())
+        logger.addHandler(_json_handler)
+    _SETTINGS = (level, json_log)
+
+
+def logging_settings():
+    # Arguments for configure_logging that reproduce the current setup, e.g. in worker processes
+    return _SETTINGS
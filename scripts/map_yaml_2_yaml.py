@@ -1,54 +1,75 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import json
+import time
 import yaml
 import argparse
 import logging
 from collections import OrderedDict
-from logger_config import logger
+from logger_config import logger, Lazy, DUMP, LOG_LEVELS, configure_logging, logging_settings
 from _helper_functions import load_helper_functions
-import re
-import copy
 import shutil
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import utils as u
 import yaml_utils as y
-
-# Load helper functions
+import template_compiler as tc
+from template_registry import get_registry
+from render_context import RenderContext
+from output_sink import OutputSink
+from icon_cache import get_icon_cache
+from parse_cache import get_parse_cache, configure_parse_cache
+from profiler import get_profiler, enable_profiling
+from file_watch import PollingWatcher, poll
+import incremental
+import team_index
+
+# Load helper functions (listed by main() once logging is configured)
 HELPER_FUNCTIONS = load_helper_functions()
 
+TEMPLATES_FOLDER = "./templates"
+DEFAULTS_FILE = "./accounts/defaults.yaml"
+PROFILE_FILE = u.cache_dir("profile", "last-run.json")
 
-def handle_special_yaml_keys(yaml_key, value):
-    pass
+DEFAULT_ICONS = {
+    "Product": "./icons/api-icon.png",
+    "Asset": "./icons/api-asset-icon.png",
+}
 
 
-def replace_placeholders(template, values, file_name, context=None):
-    if context is None:
-        kind = template.get("kind", None)
-        context = {"kind": kind}
+def report_unresolved_placeholders(templates, values):
+    for template_key, program in templates.items():
+        # Only report templates that will actually be rendered for these values
+        if not y.collect_by_path(values, template_key):
+            continue
+        for placeholder in tc.find_unresolved(program, values, HELPER_FUNCTIONS):
+            if placeholder.startswith("func."):
+                # Most likely a typo in the template: the call renders as an empty string
+                logger.warning(f"Unknown helper function '{placeholder[5:].split('(')[0]}' in {program.file_name}; '{{{{{placeholder}}}}}' renders as an empty string")
+            else:
+                logger.warning(f"Placeholder '{placeholder}' in {program.file_name} cannot be resolved from the provided values")
+
 
-    if context.get("template_key_path") is None:
-        context["template_key_path"] = ""
+def render_template(program, values, file_name, context):
+    return render_node(program.root, values, file_name, context.with_kind(program.kind))
 
-    if isinstance(template, OrderedDict):
+
+def render_node(node, values, file_name, context):
+    if isinstance(node, tc.Mapping):
         updated_template = OrderedDict()
-        for k, v in template.items():
-            tmp = copy.deepcopy(context)
-            tmp["template_key_path"] = tmp.get("template_key_path") + f".{k}" if tmp.get("template_key_path") else k
-            sub = replace_placeholders(v, values, file_name, tmp)
+        for k, v in node.items:
+            sub = render_node(v, values, file_name, context.at_template_key(k))
             if isinstance(sub, list):
                 if updated_template.get(k, None):
                     updated_template[k].extend(sub)
                 else:
-                    if k == "name":
-                        sub = sub.lower().replace(" ", "-")
-
                     updated_template[k] = sub
             elif isinstance(sub, dict):
                 updated_template[k] = sub
             elif isinstance(sub, str) and sub.isdigit():
-                if k == "name":
-                    pass
                 updated_template[k] = int(sub)
             else:
                 if sub == "" or sub == None:
@@ -59,124 +80,82 @@ def replace_placeholders(template, values, file_name, context=None):
                 else:
                     updated_template[k] = sub
         return updated_template
-    elif isinstance(template, list):
-        for item in template:
-            return [replace_placeholders(item, values, file_name, context=copy.deepcopy(context))]
-    elif isinstance(template, str):
-        # Handle the special function prefix {{func.function-name}}
-        if "{{func." in template:
-            # function_match = re.search(r"{{func\.(.*?)}}", template)
-            function_matches = re.finditer(r"{{func\.([^()}]+?)(?:\((.*?)\))?}}", template)
-            if len(re.findall(r"{{func\.([^()}]+?)(?:\((.*?)\))?}}", template)) > 1:
-                logger.info(f"Multiple function placeholders found in '{file_name}'.")
-            for function_match in function_matches:
-                if function_match:
-                    template = handle_special_functions(template, function_match, values, file_name, context=copy.deepcopy(context))
-
-            if isinstance(template, str) and template.find("{{") == -1 and template.find("}}") == -1:
-                return template
-        # Replace regular placeholders
-        while "{{" in template and "}}" in template:
-            start = template.find("{{") + 2
-            end = template.find("}}", start)
-            if start >= 0 and end >= 0:
-                placeholder = template[start:end].strip()
-                value = get_nested_value(values, placeholder, context)
-                if value is not None:
-                    if isinstance(value, dict):
-                        logger.info(f"Updating '{placeholder}' in {file_name} with value below:")
-                        logger.info(f"##?{y.format_yaml(value)}?")
-                    else:
-                        logger.info(f"Updating '{placeholder}' in {file_name} with value '{value}'")
-                else:
-                    logger.warning(f"Placeholder '{placeholder}' in {file_name} has no matching value")
-                if isinstance(value, dict) or isinstance(value, list):
-                    return value
-                else:
-                    template = template.replace(f"{{{{{{{placeholder}}}}}}}", yaml.dump(value, default_flow_style=False))
-
-                template = template.replace(f"{{{{{placeholder}}}}}", str(value) if value is not None else "")
-                if placeholder == "supportContact.microsoftTeams.url":
-                    template = y.FoldedScalarString(template)
-
-        return template
-    return template
-
-
-def handle_special_functions(template, function_match, values, file_name, context=None):
-    func_name = function_match.group(1)
-    params_str = function_match.group(2)  # Will be None if no parameters
-    func = HELPER_FUNCTIONS.get(func_name)
-    if callable(func):
-        # If we have parameters, process them
-        if params_str:
-            func_name = f"{function_match.group(1)}({function_match.group(2)})"
-            # Split multiple parameters if present
-            params = [p.strip() for p in params_str.split(",")]
-            # Get the values for each parameter path
-            param_values = []
-            for param in params:
-                # Remove any quotes around the parameter
-                param = param.strip("\"'")
-                # Get the value from the YAML using the parameter as a path
-                param_value = get_nested_value(values, param, context)
-                param_values.append(param_value)
-
-            # Call function with context, values, logger, and additional parameters
-            result = func(copy.deepcopy(context), copy.deepcopy(values), logger, *param_values)
+    elif isinstance(node, tc.Sequence):
+        if node.first is None:
+            return []
+        return [render_node(node.first, values, file_name, context)]
+    elif isinstance(node, tc.Text):
+        return render_text(node, values, file_name, context)
+    return node.value
+
+
+def render_text(text, values, file_name, context):
+    if len(text.helpers) > 1:
+        logger.info("Multiple function placeholders found in '%s'.", file_name)
+
+    rendered = {}
+    # Helper calls are resolved first; structured results replace the whole scalar
+    for call in text.helpers:
+        result = handle_special_functions(call, values, file_name, context)
+        if call.raw in tc.STRUCTURED_RESULT_HELPERS and isinstance(result, (list, dict)):
+            return result
+        rendered[call] = result
+
+    for placeholder in text.paths:
+        value = context.lookup(placeholder)
+        if value is not None:
+            if isinstance(value, dict):
+                logger.info("Updating '%s' in %s with value below:", placeholder, file_name)
+                logger.log(DUMP, "##?%s?", Lazy(y.format_yaml, value))
+            else:
+                logger.info("Updating '%s' in %s with value '%s'", placeholder, file_name, value)
+        elif tc.path_exists(context.values, placeholder):
+            logger.warning("Placeholder '%s' in %s has no matching value", placeholder, file_name)
         else:
-            # Call function without additional parameters
-            result = func(copy.deepcopy(context), copy.deepcopy(values), logger)
+            # Missing from the whole values tree: already reported once by report_unresolved_placeholders
+            logger.debug("Placeholder '%s' in %s has no matching value", placeholder, file_name)
+        if isinstance(value, dict) or isinstance(value, list):
+            return value
+        rendered[placeholder] = str(value) if value is not None else ""
 
-        # result = func(copy.deepcopy(context), copy.deepcopy(values), logger)
+    result = "".join(
+        segment if isinstance(segment, str) else rendered[segment if isinstance(segment, tc.HelperCall) else segment.path]
+        for segment in text.segments
+    )
+    return y.FoldedScalarString(result) if text.folded else result
 
-        if isinstance(result, list) and (func_name == "lookup_teams_ids" or func_name == "get_asset_name_list" or func_name == "get_asset_resources"):
-            return result
-        elif isinstance(result, dict) and func_name == "lookup_teams_ids":
-            return result
-        else:
-            logger.info(f"Calling function '{func_name}' in {file_name} with result '{result}'")
 
-            return template.replace(f"{{{{func.{func_name}}}}}", result)
-    else:
-        logger.warning(f"Function '{func_name}' in {file_name} does not exist.")
-        return template  # Leave the placeholder unchanged
-
-
-def get_nested_value(values, key, context=None):
-    context = copy.deepcopy(context)
-    keys = key.split(".")
-    list_index = context.get("list_index") if context else None
-    key_path = context.get("key_path") if context else None
-    v = context.get("values") if context else {}
-    for k in keys:
-        if isinstance(v, dict) and k in v:
-            v = v[k]
-        elif isinstance(v, list) and k == "[]":
-            v = v[list_index.pop(0)]
-        else:
-            return None
-    return v
+def handle_special_functions(call, values, file_name, context):
+    func = HELPER_FUNCTIONS.get(call.name)
+    if not callable(func):
+        # As before the compiled templates: the unknown call is replaced like a placeholder without a value.
+        # Already reported once by report_unresolved_placeholders.
+        logger.debug(f"Function '{call.name}' in {file_name} does not exist, rendering an empty string.")
+        return ""
+
+    # Get the values for each parameter path
+    param_values = [context.lookup(param) for param in call.params]
+    # Call function with context, values, logger, and additional parameters; both are shared and read-only
+    result = func(context, values, logger, *param_values)
 
+    if call.raw in tc.STRUCTURED_RESULT_HELPERS and isinstance(result, (list, dict)):
+        return result
 
-def write_yaml_file(yaml_data, output_folder):
-    # Ensure output folder exists
-    os.makedirs(output_folder, exist_ok=True)
+    logger.info("Calling function '%s' in %s with result '%s'", call.raw, file_name, result)
+    return str(result) if result is not None else ""
+
+
+def write_yaml_file(yaml_data, sink, icon_path=None):
     file_name = f"{yaml_data.get('kind')}.yaml"
 
+    # An "icon" path on the asset/product values overrides the default icon for its kind
     if yaml_data.get("kind") == "Product":
-        y.update_icon_in_yaml(yaml_data, "./icons/api-icon.png")
+        y.update_icon_in_yaml(yaml_data, icon_path or DEFAULT_ICONS["Product"])
     elif yaml_data.get("kind") == "Asset":
-        y.update_icon_in_yaml(yaml_data, "./icons/api-asset-icon.png")
+        y.update_icon_in_yaml(yaml_data, icon_path or DEFAULT_ICONS["Asset"])
         yaml_data_no_auto_release = yaml_data.copy()
         del yaml_data_no_auto_release["spec"]["autoRelease"]
-        output_file = os.path.join(output_folder, f"no-auto-release-{file_name}")
-        # Open the file in append mode if it exists, else in write mode
-        mode = "a" if os.path.exists(output_file) else "w"
-        with open(output_file, mode) as f:
-            if mode == "a":
-                f.write("\n---\n")
-            y.ordered_dump(yaml_data_no_auto_release, f, default_flow_style=False)
+        sink.write(f"no-auto-release-{file_name}", yaml_data_no_auto_release)
 
     if yaml_data.get("kind") == "ReleaseTag":
         file_name = (
@@ -185,120 +164,89 @@ def write_yaml_file(yaml_data, output_folder):
     elif yaml_data.get("kind") == "AccessControlList":
         file_name = f"{yaml_data.get('kind')}-{yaml_data.get("metadata").get("scope").get("kind")}.yaml"
 
-    output_file = os.path.join(output_folder, file_name)
-    # Open the file in append mode if it exists, else in write mode
-    mode = "a" if os.path.exists(output_file) else "w"
-    with open(output_file, mode) as f:
-        if mode == "a":
-            f.write("\n---\n")
-        y.ordered_dump(yaml_data, f, default_flow_style=False)
+    sink.write(file_name, yaml_data)
+
+
+def render_document(program, value, template_file, context):
+    updated_template = render_template(program, value, template_file, context)
+
+    # Add tags and attributes if present
+    if isinstance(value, dict) and (value.get("tags") or value.get("attributes")):
+        tags = value.get("tags", [])
+        if context.key_path[-1] != "[]":
+            # Mappings (e.g. product) are also tagged with every service environment and its region
+            tags = list(tags) + context.model.environment_tags()
+
+        updated_template["tags"] = tags
+        updated_template["attributes"] = value.get("attributes", {})
+    return updated_template
+
+
+def emit_document(template_key, program, value, context, templates, sink):
+    with get_profiler().template(template_key, program.kind):
+        icon_path = value.get("icon") if isinstance(value, dict) else None
+        if not sink.incremental:
+            write_yaml_file(render_document(program, value, program.file_name, context), sink, icon_path=icon_path)
+            return
 
+        doc_id = incremental.document_id(template_key, context.list_index)
+        inputs = {"template": templates.digest(template_key), "value": incremental.digest_value(value)}
+        if program.kind in DEFAULT_ICONS:
+            inputs["icon"] = get_icon_cache().digest(icon_path or DEFAULT_ICONS[program.kind])[0]
+        if sink.reuse(doc_id, inputs, context.resolver):
+            logger.info("*Unchanged* document '%s', reusing previous output", doc_id)
+            return
+        with sink.capture(doc_id, inputs, context.resolver):
+            write_yaml_file(render_document(program, value, program.file_name, context), sink, icon_path=icon_path)
 
-def walk_keys(values, input_folder, output_folder, parent_key="", context=None):
+
+def walk_keys(values, templates, sink, parent_key="", context=None):
     if not isinstance(values, dict):
         return
     if u.is_yaml_primitive(values):
         return
 
     if context is None:
-        context = {
-            "key_path": "",
-            "kind": None,
-            "values": values,
-            "list_index": None,
-        }
+        context = RenderContext.for_values(values)
 
     for key, value in values.items():
         current_key = f"{parent_key}.{key}" if parent_key else key
         current_key = f"{current_key}.[]" if isinstance(value, list) else current_key
-        context["key_path"] = current_key
+        key_context = context.at_key(current_key)
         # Check if there's a template for this key
 
         # !!!!!!!CLEAN UP: Remove this condition
         if current_key == "product.assets.[]":
             continue
 
-        if current_key == "assets.[].services.[].releaseState":
-            pass
-
         template_key = current_key.replace(".[]", "")
-        if (file_name := u.get_template_filename(template_key)) and os.path.exists(template_file := os.path.join(input_folder, file_name)):
-            logger.info(f"*Processing* key '{current_key}' with template: {template_file}")
-            template = y.load_and_validate_yaml([template_file])
-            context["kind"] = template.get("kind")
-            # Prepare scoped values for the current key
+        if program := templates.get(template_key):
+            logger.info("*Processing* key '%s' with template: %s", current_key, program.file_name)
 
             # If the value is a list, process each item individually (e.g., assets array)
             if isinstance(value, list):
                 if key == "accessControlList":
-                    logger.info(f"*Processing* key !{current_key}!")
-                    context["list_index"].append("*")
-                    updated_template = replace_placeholders(template, value, template_file, context=copy.deepcopy(context))
+                    logger.info("*Processing* key !%s!", current_key)
                     # Write the updated template to the output file
-                    write_yaml_file(updated_template, output_folder)
-                    logger.info(f"*Finished* processing key !{current_key}!")
+                    emit_document(template_key, program, value, key_context.at_index("*"), templates, sink)
+                    logger.info("*Finished* processing key !%s!", current_key)
                     continue
 
                 for index, item in enumerate(value):
-                    logger.info(f"*Processing* key !{current_key}! item !{index + 1}! in '{current_key}'")
-
-                    keys = current_key.split(".")  # Split once and reuse
-                    # Check if the item has a 'kind' field that matches the template
-                    kind = template.get("kind", None)
-                    if context.get("list_index") is None:
-                        context["list_index"] = [index]
-                    else:
-                        context["list_index"].append(index)
-                    # Replace placeholders in the template for the current item
-                    updated_template = replace_placeholders(template, item, template_file, context=copy.deepcopy(context))
-                    if key == "accessControlList":
-                        template = updated_template
-
-                    # Add tags and attributes if present
-                    if isinstance(item, dict):
-                        if item.get("tags") or item.get("attributes"):
-                            updated_template["tags"] = item.get("tags", [])
-                            updated_template["attributes"] = item.get("attributes", {})
-
-                    # Write the updated template to the output file
-                    write_yaml_file(updated_template, output_folder)
+                    logger.info("*Processing* key !%s! item !%d! in '%s'", current_key, index + 1, current_key)
+                    item_context = key_context.at_index(index)
+                    # Replace placeholders in the template for the current item and write it to the output file
+                    emit_document(template_key, program, item, item_context, templates, sink)
 
                     # Recursively process nested keys in the item
                     if isinstance(item, dict):
-                        walk_keys(item, input_folder, output_folder, parent_key=current_key, context=copy.deepcopy(context))
+                        walk_keys(item, templates, sink, parent_key=current_key, context=item_context)
 
-                    context["list_index"].pop()
-                    logger.info(f"*Finished* processing key !{current_key}! item !{index + 1}! in '{current_key}'")
-                    if key == "assets":
-                        current_key = f"{parent_key}.{key}" if parent_key else key
-                        current_key = f"{current_key}.[]" if isinstance(value, list) else current_key
-                        context["key_path"] = current_key
-                        del context["list_index"]
+                    logger.info("*Finished* processing key !%s! item !%d! in '%s'", current_key, index + 1, current_key)
 
             # If the value is a dictionary, process it directly
-            elif isinstance(value, dict):
-                updated_template = replace_placeholders(template, value, template_file, context=copy.deepcopy(context))
-
-                # Add tags and attributes if present
-                if value.get("tags") or value.get("attributes"):
-                    environments = y.collect_distinct_by_path(context.get("values", {}), "assets.services.environment")
-                    tags = value.get("tags", [])
-                    for env in environments:
-                        parts = env.split("-")
-                        region = "-".join(parts[-3:])
-                        # prefix = "-".join(parts[:-3])
-                        tags.append(f"env:{env}")
-                        tags.append(f"region:{region}")
-
-                    updated_template["tags"] = value.get("tags", [])
-                    updated_template["attributes"] = value.get("attributes", {})
-
-                # Write the updated template to the output file
-                write_yaml_file(updated_template, output_folder)
-
-        if current_key == "assets.[].services.[].releaseState":
-            updated_template = replace_placeholders(template, value, template_file, context=copy.deepcopy(context))
-            write_yaml_file(updated_template, output_folder)
+            elif isinstance(value, dict) or current_key == "assets.[].services.[].releaseState":
+                emit_document(template_key, program, value, key_context, templates, sink)
 
         # if current_key == "assets.[].lifecycle":
         #     tmp = template["spec"]
@@ -307,7 +255,7 @@ def walk_keys(values, input_folder, output_folder, parent_key="", context=None):
 
         # Recursively process nested keys
         if isinstance(value, dict):
-            walk_keys(value, input_folder, output_folder, parent_key=current_key, context=copy.deepcopy(context))
+            walk_keys(value, templates, sink, parent_key=current_key, context=key_context)
 
 
 def update_yaml_with_services(defaults_data, services_data, key_path):
@@ -317,62 +265,348 @@ def update_yaml_with_services(defaults_data, services_data, key_path):
         for service in asset.get("services", []):
             services.append({"name": service["name"], "asset": asset["name"]})
 
-    # Navigate to the specified key path in defaults.yaml
-    keys = key_path.split(".")
-    data = defaults_data
-    for key in keys:
-        if isinstance(data, list):
-            data = [d[key] for d in data if key in d]
-        else:
-            data = data.get(key, {})
+    # The first item of each list at key_path (the first quota of each default plan) gets every service.
+    # defaults_data is left as is: only the containers on the way are copied, the rest is shared.
+    return _with_services(defaults_data, key_path.split("."), services)
 
-    # If we reached a list of quotas, update each one
-    if isinstance(data, list):
-        for item in data:
-            item[0]["services"] = services
 
-    return defaults_data
+def _with_services(data, keys, services):
+    if isinstance(data, list):
+        return [_with_services(item, keys, services) if isinstance(item, dict) and keys[0] in item else item for item in data]
+    if not isinstance(data, dict) or not isinstance(value := data.get(keys[0]), (dict, list)):
+        return data
+    if len(keys) > 1:
+        value = _with_services(value, keys[1:], services)
+    elif value and isinstance(value[0], dict):
+        value = [OrderedDict(value[0], services=services)] + value[1:]
+    else:
+        return data
+    return OrderedDict(data, **{keys[0]: value})
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Replace placeholders in YAML templates with values from a YAML file.")
-    parser.add_argument("-f", "--filename", nargs="+", required=True, help="YAML file(s) or directory(ies) containing YAML files.")
-    parser.add_argument("-o", "--output", help="Folder to write updated YAML files.")
-    # values is now filename parameter
-    args = parser.parse_args()
+def load_defaults(defaults_file=DEFAULTS_FILE):
+    with get_profiler().phase("load defaults"):
+        defaults_dict = y.load_and_validate_yaml([defaults_file])
+    # Dumps are only formatted when the DUMP level is enabled (the default "verbose" log level)
+    logger.log(DUMP, "Defaults YAML data:")
+    logger.log(DUMP, "##?%s?", Lazy(y.format_yaml, defaults_dict))
+    return defaults_dict
 
-    try:
-        combined_dict = y.load_and_validate_yaml(args.filename)
-        logger.info(f"Combined YAML data from files {args.filename} below:")
-        logger.info(f"##?{y.format_yaml(combined_dict)}?")
 
-        defaults_dict = y.load_and_validate_yaml(["./accounts/defaults.yaml"])
-        logger.info(f"Defaults YAML data:")
-        logger.info(f"##?{y.format_yaml(defaults_dict)}?")
+def merged_values(filenames, defaults_dict):
+    profiler = get_profiler()
+    with profiler.phase("load params"):
+        combined_dict = y.load_and_validate_yaml(filenames)
+    logger.log(DUMP, "Combined YAML data from files %s below:", filenames)
+    logger.log(DUMP, "##?%s?", Lazy(y.format_yaml, combined_dict))
 
+    # defaults_dict is shared across accounts: neither step modifies it, the merged values share its unchanged subtrees
+    with profiler.phase("update_yaml_with_services"):
         defaults_dict = update_yaml_with_services(defaults_dict, combined_dict, "product.plans.quotas")
+    with profiler.phase("deep_merge"):
         combined_dict = y.deep_merge(defaults_dict, combined_dict)
-        logger.info(f"Combined YAML data after applying defaults:")
-        logger.info(f"##?{y.format_yaml(combined_dict)}?")
-        write_yaml_file(combined_dict, args.output)
+    logger.log(DUMP, "Combined YAML data after applying defaults:")
+    logger.log(DUMP, "##?%s?", Lazy(y.format_yaml, combined_dict))
+    return combined_dict
+
+
+def render_account(filenames, defaults_dict, templates, output_folder, incremental_inputs=None):
+    profiler = get_profiler()
+    combined_dict = merged_values(filenames, defaults_dict)
+    with profiler.phase("check placeholders"):
+        report_unresolved_placeholders(templates, combined_dict)
+
+    # Start walking from the root (parent_key="") of the values.yaml file; documents are buffered in memory
+    if incremental_inputs is not None:
+        sink = incremental.IncrementalSink(output_folder, incremental_inputs)
+    else:
+        sink = OutputSink(output_folder)
+    with profiler.phase("walk_keys"):
+        walk_keys(combined_dict, templates, sink, parent_key="")
+
+    # Only replace the output folder once every document rendered successfully
+    with profiler.phase("write"):
+        if not sink.incremental and os.path.exists(output_folder):
+            shutil.rmtree(output_folder)  # Deletes the folder and its contents
+        sink.flush()
+    team_index.report_misses()
+
+    if sink.incremental:
+        logger.info(f"*Incremental* render: !{sink.rendered}! document(s) rendered, !{sink.reused}! reused unchanged")
+    logger.info(f"All YAML documents written to folder: '{output_folder}'")
+
+
+def incremental_inputs(defaults_dict):
+    # Inputs shared by every document; a change to any of them re-renders everything
+    return {
+        "defaults": incremental.digest_value(defaults_dict),
+        "team_data": incremental.digest_file(team_index.TEAM_DATA_FILE),
+        "helpers": incremental.helper_version(),
+    }
+
+
+def discover_accounts(accounts_folder):
+    # Every accounts/<org>/<env>/ folder holding parameter files is one account to render
+    accounts = []
+    for org in sorted(os.listdir(accounts_folder)):
+        if not os.path.isdir(org_folder := os.path.join(accounts_folder, org)):
+            continue
+        for env in sorted(os.listdir(org_folder)):
+            if os.path.isdir(env_folder := os.path.join(org_folder, env)) and glob(os.path.join(env_folder, "*.yaml")):
+                accounts.append((org, env, env_folder))
+    return accounts
+
+
+# Parsed defaults and compiled templates, handed to each batch worker once
+_BATCH_STATE = None
+
+
+def enable_profile():
+    # Times the phases, templates and every HELPER_FUNCTIONS entry (wrapped in place) from now on
+    profiler = enable_profiling()
+    HELPER_FUNCTIONS.update(profiler.wrap_helpers(HELPER_FUNCTIONS))
+    return profiler
 
-        # Deletes the output folder if it exists and recreates it.
-        if os.path.exists(args.output):
-            shutil.rmtree(args.output)  # Deletes the folder and its contents
-        os.makedirs(args.output, exist_ok=True)
 
-        # Start walking from the root (parent_key="") of the values.yaml file
-        walk_keys(combined_dict, "./templates", args.output, parent_key="")
+def write_profile(profile_file):
+    report = get_profiler().report()
+    os.makedirs(os.path.dirname(profile_file) or ".", exist_ok=True)
+    u.write_file_atomic(profile_file, json.dumps(report, indent=2))
+    print(get_profiler().table(report))
+    print(f"Profile written to '{profile_file}'")
 
-        logger.info(f"All YAML documents written to folder: '{args.output}'")
+
+def _init_batch_worker(defaults_dict, templates, inputs, log_settings, parse_cache, profile):
+    global _BATCH_STATE
+    configure_logging(*log_settings)
+    configure_parse_cache(parse_cache)
+    if profile:
+        enable_profile()
+    _BATCH_STATE = (defaults_dict, templates, inputs)
+
+
+def _render_batch_account(account_folder, output_folder):
+    # -> (error or None, profile report of this account or None)
+    defaults_dict, templates, inputs = _BATCH_STATE
+    profiler = get_profiler()
+    if profiler.enabled:
+        profiler.reset()
+    try:
+        render_account([account_folder], defaults_dict, templates, output_folder, inputs)
+    except (y.DuplicateKeyError, FileNotFoundError) as e:
+        return str(e), None
+    except Exception as e:
+        # Any other failure of one account (a helper error on incomplete values, ...) is reported with the others
+        return f"{type(e).__name__}: {e}", None
+    return None, profiler.report() if profiler.enabled else None
+
+
+def render_batch(accounts_folder, output_root, jobs=None, incremental_mode=False):
+    profiler = get_profiler()
+    defaults_dict = load_defaults(os.path.join(accounts_folder, os.path.basename(DEFAULTS_FILE)))
+    with profiler.phase("load templates"):
+        templates = get_registry(TEMPLATES_FOLDER)
+    inputs = incremental_inputs(defaults_dict) if incremental_mode else None
+    accounts = discover_accounts(accounts_folder)
+    logger.info(f"*Batch* rendering {len(accounts)} account(s) from '{accounts_folder}' with {jobs or os.cpu_count()} worker(s)")
+
+    failures = {}
+    initargs = (defaults_dict, templates, inputs, logging_settings(), get_parse_cache().cache_dir is not None, profiler.enabled)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker, initargs=initargs) as executor:
+        futures = {
+            executor.submit(_render_batch_account, account_folder, os.path.join(output_root, org, env)): f"{org}/{env}"
+            for org, env, account_folder in accounts
+        }
+        for future in as_completed(futures):
+            try:
+                error, report = future.result()
+            except Exception as e:
+                # The worker itself failed (e.g. it was killed)
+                error, report = f"{type(e).__name__}: {e}", None
+            if error:
+                failures[futures[future]] = error
+            if report:
+                # Summed over the workers, so phases can add up to more than the wall time
+                profiler.merge(report)
+
+    for account, error in sorted(failures.items()):
+        logger.error(f"Failed to render account '{account}': {error}")
+    logger.info(f"*Batch* rendered {len(accounts) - len(failures)} of {len(accounts)} account(s) into '{output_root}'")
+    return not failures
+
+
+def watched_accounts(args):
+    # account -> (parameter files or folders, output folder); --batch accounts are discovered again on every change
+    if args.batch:
+        return {f"{org}/{env}": ([account_folder], os.path.join(args.output, org, env)) for org, env, account_folder in discover_accounts(args.batch)}
+    return {"": (args.filename, args.output)}
+
+
+def _watch_patterns(args):
+    if args.batch:
+        return [os.path.join(args.batch, "*", "*", "*.yaml")]
+    return [os.path.join(f, "*.yaml") if os.path.isdir(f) else f for f in args.filename]
+
+
+def _account_changed(filenames, changed):
+    sources = {os.path.normpath(f) for f in filenames}
+    return any(path in sources or os.path.dirname(path) in sources for path in changed)
+
+
+class WatchState:
+    # Everything a render needs that outlives a single change: defaults, compiled templates (refreshed in place by
+    # the registry) and the team index stay in memory, so a save only costs parsing and rendering the accounts it touches
+    def __init__(self, args):
+        self.args = args
+        self.defaults_file = os.path.normpath(os.path.join(args.batch, os.path.basename(DEFAULTS_FILE)) if args.batch else DEFAULTS_FILE)
+        self.team_file = os.path.normpath(team_index.TEAM_DATA_FILE)
+        self.templates = get_registry(TEMPLATES_FOLDER)
+        self.defaults_dict = None
+        self.inputs = None
+        self.accounts = watched_accounts(args)
+        self.watcher = PollingWatcher(_watch_patterns(args) + [self.defaults_file, self.team_file])
+
+    def load_shared(self):
+        # Defaults and team data; False (and the error logged) while they cannot be loaded
+        try:
+            self.defaults_dict = load_defaults(self.defaults_file)
+            team_index.get_team_index(team_index.TEAM_DATA_FILE)
+        except (y.DuplicateKeyError, FileNotFoundError, yaml.YAMLError) as e:
+            logger.error(f"Cannot render until this is fixed: {e}")
+            self.defaults_dict = None
+            return False
+        self.inputs = incremental_inputs(self.defaults_dict) if self.args.incremental else None
+        return True
+
+    def render(self, names):
+        start = time.perf_counter()
+        failed = 0
+        for name in sorted(names):
+            filenames, output_folder = self.accounts[name]
+            try:
+                render_account(filenames, self.defaults_dict, self.templates, output_folder, self.inputs)
+            except Exception as e:
+                # A half-written or invalid file must not end the watch: the next save renders the account again
+                logger.error(f"Failed to render account '{name or output_folder}': {e}")
+                failed += 1
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Rendered {len(names) - failed} of {len(names)} account(s) in {elapsed:.0f} ms", flush=True)
+
+    def remove(self, name):
+        # The account has no parameter files anymore: its output would otherwise still look current
+        output_folder = self.accounts.pop(name)[1]
+        if os.path.exists(output_folder):
+            shutil.rmtree(output_folder)
+            logger.warning(f"*Watch* account '{name}' has no parameter files anymore, removed its output '{output_folder}'")
+        else:
+            logger.warning(f"*Watch* account '{name}' has no parameter files anymore")
+
+    def check(self):
+        errors = []
+        changed_templates = self.templates.refresh(errors)
+        for template_key, e in errors:
+            # The last good program of the template stays in use until the file is fixed
+            logger.error(f"Failed to load template '{self.templates.key_map[template_key]}': {e}")
+        changed = self.watcher.changes()
+        if not changed and not changed_templates:
+            return
+
+        stale = set()
+        if self.defaults_file in changed or self.team_file in changed or self.defaults_dict is None:
+            team_index.forget_team_index(team_index.TEAM_DATA_FILE)
+            if not self.load_shared():
+                return
+            stale = set(self.accounts)
+        if changed_templates:
+            logger.info(f"*Watch* templates changed: {', '.join(changed_templates)}")
+            stale = set(self.accounts)
+        if self.args.batch and changed:
+            accounts = watched_accounts(self.args)
+            for name in sorted(self.accounts.keys() - accounts.keys()):
+                self.remove(name)
+            self.accounts = accounts
+        stale |= {name for name, (filenames, _) in self.accounts.items() if _account_changed(filenames, changed)}
+        stale &= set(self.accounts)
+        if stale:
+            self.render(stale)
+
+
+def watch(args, interval):
+    state = WatchState(args)
+    if state.load_shared():
+        state.render(set(state.accounts))
+    print(f"Watching {len(state.accounts)} account(s), '{TEMPLATES_FOLDER}', '{state.defaults_file}' and the team data every {interval}s (Ctrl-C to stop)", flush=True)
+    poll(interval, state.check)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace placeholders in YAML templates with values from a YAML file.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-f", "--filename", nargs="+", help="YAML file(s) or directory(ies) containing YAML files.")
+    source.add_argument("--batch", metavar="ACCOUNTS_FOLDER", help="Render every <org>/<env>/ folder under ACCOUNTS_FOLDER into OUTPUT/<org>/<env>/.")
+    parser.add_argument("-o", "--output", required=True, help="Folder to write updated YAML files.")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes for --batch (default: CPU count).")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Only re-render documents whose inputs changed since the last run and leave unchanged files untouched."
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=list(LOG_LEVELS),
+        help="verbose (default) also logs YAML dumps of the values; info skips them; quiet only logs warnings and errors.",
+    )
+    parser.add_argument("--log-json", metavar="FILE", help="Also append log records to FILE as JSON lines.")
+    parser.add_argument(
+        "--parse-cache",
+        action="store_true",
+        help="Reuse the parsed content of unchanged YAML files, cached under ~/.cache/marketplace/parsed (also MARKETPLACE_PARSE_CACHE=1).",
+    )
+    parser.add_argument("--profile", action="store_true", help="Time each phase, template and helper function; print a table and write a JSON report.")
+    parser.add_argument("--profile-json", metavar="FILE", default=PROFILE_FILE, help=f"Where --profile writes its JSON report (default: {PROFILE_FILE}).")
+    parser.add_argument(
+        "--watch", action="store_true", help="Keep running: poll the parameter files, templates, defaults and team data and re-render the accounts they affect."
+    )
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between two polls in --watch mode (default: 0.5).")
+    # values is now filename parameter
+    args = parser.parse_args()
+    try:
+        configure_logging(args.log_level, args.log_json)
+    except ValueError as e:
+        parser.error(str(e))
+    logger.info(f"Current working directory: {os.getcwd()}")
+    logger.info(f"Loaded helper functions: {', '.join(HELPER_FUNCTIONS)}")
+    if args.parse_cache:
+        configure_parse_cache(True)
+    if args.watch and args.profile:
+        parser.error("--profile cannot be combined with --watch")
+    if args.profile:
+        enable_profile()
+
+    if args.watch:
+        return watch(args, args.interval)
+
+    if args.batch:
+        ok = render_batch(args.batch, args.output, args.jobs, args.incremental)
+        if args.profile:
+            write_profile(args.profile_json)
+        return 0 if ok else 1
+
+    try:
+        defaults_dict = load_defaults()
+        # Every template is loaded and compiled once, then rendered for each item
+        with get_profiler().phase("load templates"):
+            templates = get_registry(TEMPLATES_FOLDER)
+        inputs = incremental_inputs(defaults_dict) if args.incremental else None
+        render_account(args.filename, defaults_dict, templates, args.output, inputs)
 
     except y.DuplicateKeyError as e:
         print("Validation failed:", e)
     except FileNotFoundError as e:
         print(e)
+    else:
+        if args.profile:
+            write_profile(args.profile_json)
 
 
 if __name__ == "__main__":
-    current_dir = os.getcwd()
-    logger.info(f"Current working directory: {current_dir}")
-    main()
+    sys.exit(main())
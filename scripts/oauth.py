@@ -15,25 +15,30 @@ if not CLIENT_ID or not CLIENT_SECRET or not TOKEN_URL:
     raise ValueError("CLIENT_ID and CLIENT_SECRET environment variables must be set.")
 
 
-def get_access_token():
+def request_access_token(session=requests, timeout=None):
+    # Full token response (access_token, expires_in, ...); pass a requests.Session to reuse its connections
     payload = {"grant_type": "client_credentials", "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET}
 
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-    response = requests.post(TOKEN_URL, data=payload, headers=headers)
+    response = session.post(TOKEN_URL, data=payload, headers=headers, timeout=timeout)
 
     if response.status_code == 200:
-        return response.json().get("access_token")
+        return response.json()
     else:
         raise RuntimeError(f"Failed to obtain session token: {response.status_code} {response.text}")
 
 
-def get_session_token(access_token):
+def get_access_token(session=requests):
+    return request_access_token(session).get("access_token")
+
+
+def get_session_token(access_token, session=requests, timeout=None):
     payload = {"username": SESSION_USERNAME, "password": SESSION_TOKEN_PASSWORD, "from": "pipeline_scripts"}
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    response = requests.post(SESSION_TOKEN_URL, json=payload, headers=headers)
+    response = session.post(SESSION_TOKEN_URL, json=payload, headers=headers, timeout=timeout)
 
     if response.status_code == 200:
         return response.json().get("result").get("csrfToken")
@@ -0,0 +1,45 @@
+import io
+import os
+
+import utils as u
+import yaml_utils as y
+
+
+class OutputSink:
+    # Buffers YAML documents per output file; flush() writes each file once, atomically (temp file + rename)
+    incremental = False
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        self._streams = {}
+
+    def _stream(self, file_name):
+        stream = self._streams.get(file_name)
+        if stream is None:
+            stream = self._streams[file_name] = io.StringIO()
+        else:
+            stream.write("\n---\n")
+        return stream
+
+    def write(self, file_name, data):
+        # Returns the (start, end) offsets of the document within the file
+        stream = self._stream(file_name)
+        start = stream.tell()
+        y.ordered_dump(data, stream, default_flow_style=False)
+        return start, stream.tell()
+
+    def write_text(self, file_name, text):
+        # Append an already serialized document
+        stream = self._stream(file_name)
+        start = stream.tell()
+        stream.write(text)
+        return start, stream.tell()
+
+    def files(self):
+        return {file_name: stream.getvalue() for file_name, stream in self._streams.items()}
+
+    def flush(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        for file_name, content in self.files().items():
+            u.write_file_atomic(os.path.join(self.output_folder, file_name), content)
+        self._streams.clear()
@@ -0,0 +1,110 @@
+import os
+import marshal
+import hashlib
+from collections import OrderedDict
+
+import utils as u
+from logger_config import logger
+
+# Bump when the loaders produce different objects for the same text, so older entries are not reused
+CACHE_VERSION = 2
+# Everything the YAML loaders construct that is stored; anything else (timestamps, ...) is parsed on every run
+_SCALARS = (str, int, float, bool, bytes, type(None))
+
+
+def _to_data(value):
+    # Parsed documents -> plain dicts/lists/scalars that marshal can store (dicts keep their key order)
+    if isinstance(value, dict):
+        return {_to_data(k): _to_data(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_data(item) for item in value]
+    if type(value) in _SCALARS:
+        return value
+    raise ValueError(f"cannot cache a {type(value).__name__}")
+
+
+def _from_data(value):
+    # Inverse of _to_data; rejects anything _to_data would not have written
+    if isinstance(value, dict):
+        return OrderedDict((_from_data(k), _from_data(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_from_data(item) for item in value]
+    if type(value) in _SCALARS:
+        return value
+    raise ValueError(f"unexpected {type(value).__name__} in cache entry")
+
+
+class ParseCache:
+    # Parsed documents of YAML files, keyed by the SHA-256 of the file content, the loader and CACHE_VERSION.
+    # Entries are stored with marshal as plain data (never pickled), under a per-user cache folder, so an
+    # unchanged file is not parsed again by later runs; every load returns fresh objects that callers may modify.
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, content, loader):
+        key = hashlib.sha256(content)
+        key.update(f"\0{loader.__module__}.{loader.__qualname__}:{CACHE_VERSION}".encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{key.hexdigest()}.marshal")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return _from_data(marshal.load(f))
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning("Ignoring unreadable parse cache entry '%s': %s", path, e)
+            return None
+
+    def _write(self, path, documents):
+        try:
+            data = marshal.dumps(_to_data(documents))
+        except ValueError as e:
+            logger.debug("Not caching the parsed content of '%s': %s", path, e)
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            with u.open_atomic(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning("Could not persist parse cache to '%s': %s", self.cache_dir, e)
+
+    def load(self, file_path, loader, parse):
+        # parse(text) -> list of documents; only called on a cache miss
+        with open(file_path, "rb") as f:
+            content = f.read()
+        if not self.cache_dir:
+            return parse(content.decode("utf-8"))
+
+        path = self._path(content, loader)
+        documents = self._read(path)
+        if documents is not None:
+            self.hits += 1
+            return documents
+        self.misses += 1
+        documents = parse(content.decode("utf-8"))
+        self._write(path, documents)
+        return documents
+
+
+_PARSE_CACHE = None
+
+
+def parse_cache_enabled():
+    # Off unless MARKETPLACE_PARSE_CACHE=1 (or --parse-cache)
+    return os.getenv("MARKETPLACE_PARSE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+
+
+def get_parse_cache():
+    # Process-wide cache persisted under the per-user cache folder (see utils.user_cache_dir) when enabled
+    global _PARSE_CACHE
+    if _PARSE_CACHE is None:
+        _PARSE_CACHE = ParseCache(u.user_cache_dir("parsed") if parse_cache_enabled() else None)
+    return _PARSE_CACHE
+
+
+def configure_parse_cache(enabled):
+    global _PARSE_CACHE
+    _PARSE_CACHE = ParseCache(u.user_cache_dir("parsed") if enabled else None)
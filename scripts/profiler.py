@@ -0,0 +1,123 @@
+import time
+import functools
+from contextlib import contextmanager, nullcontext
+
+# Wall-time profile of a render, enabled by map_yaml_2_yaml.py --profile: time per phase, renders and time per
+# template, calls and cumulative time per helper function. Disabled, every hook is a shared no-op context.
+
+_NO_OP = nullcontext()
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        # name -> [count, seconds]
+        self.phases = {}
+        self.helpers = {}
+        # template key -> [kind, count, seconds]
+        self.templates = {}
+
+    def _add(self, table, name, seconds, count=1):
+        stats = table.setdefault(name, [0, 0.0])
+        stats[0] += count
+        stats[1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(self.phases, name, time.perf_counter() - start)
+
+    @contextmanager
+    def template(self, template_key, kind):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self.templates.setdefault(template_key, [kind, 0, 0.0])
+            stats[1] += 1
+            stats[2] += time.perf_counter() - start
+
+    def wrap_helpers(self, functions):
+        # {name: function} -> {name: timed function}; calls between helpers inside the module are not counted
+        def timed(name, func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._add(self.helpers, name, time.perf_counter() - start)
+
+            return wrapper
+
+        return {name: timed(name, func) for name, func in functions.items()}
+
+    def merge(self, report):
+        # Adds a report() of another process (batch workers)
+        for entry in report["phases"]:
+            self._add(self.phases, entry["name"], entry["seconds"], entry["count"])
+        for entry in report["helpers"]:
+            self._add(self.helpers, entry["name"], entry["seconds"], entry["calls"])
+        for entry in report["templates"]:
+            stats = self.templates.setdefault(entry["template"], [entry["kind"], 0, 0.0])
+            stats[1] += entry["renders"]
+            stats[2] += entry["seconds"]
+
+    def report(self):
+        by_time = lambda item: -item[1][-1]
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "phases": [{"name": name, "count": count, "seconds": seconds} for name, (count, seconds) in self.phases.items()],
+            "templates": [
+                {"template": key, "kind": kind, "renders": count, "seconds": seconds}
+                for key, (kind, count, seconds) in sorted(self.templates.items(), key=by_time)
+            ],
+            "helpers": [{"name": name, "calls": count, "seconds": seconds} for name, (count, seconds) in sorted(self.helpers.items(), key=by_time)],
+        }
+
+    def table(self, report=None):
+        report = report or self.report()
+        total = report["total_seconds"] or 1.0
+        lines = [f"Profile: {report['total_seconds'] * 1000:.1f} ms total", "", f"{'phase':<32} {'count':>7} {'ms':>10} {'%':>6}"]
+        lines += [f"{e['name']:<32} {e['count']:>7} {e['seconds'] * 1000:>10.2f} {e['seconds'] / total:>6.1%}" for e in report["phases"]]
+        lines += ["", f"{'template':<32} {'renders':>7} {'ms':>10} {'ms/render':>10}"]
+        lines += [f"{e['template']:<32} {e['renders']:>7} {e['seconds'] * 1000:>10.2f} {e['seconds'] * 1000 / e['renders']:>10.3f}" for e in report["templates"]]
+        lines += ["", f"{'helper':<32} {'calls':>7} {'ms':>10} {'us/call':>10}"]
+        lines += [f"{e['name']:<32} {e['calls']:>7} {e['seconds'] * 1000:>10.2f} {e['seconds'] * 1e6 / e['calls']:>10.1f}" for e in report["helpers"]]
+        return "\n".join(lines)
+
+
+class NullProfiler:
+    enabled = False
+
+    def phase(self, name):
+        return _NO_OP
+
+    def template(self, template_key, kind):
+        return _NO_OP
+
+
+_PROFILER = NullProfiler()
+
+
+def get_profiler():
+    return _PROFILER
+
+
+def enable_profiling():
+    global _PROFILER
+    _PROFILER = Profiler()
+    return _PROFILER
+
+
+def disable_profiling():
+    global _PROFILER
+    _PROFILER = NullProfiler()
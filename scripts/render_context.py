@@ -0,0 +1,39 @@
+from collections import namedtuple
+
+from value_paths import ValueResolver
+from catalog_model import CatalogModel
+
+
+class RenderContext(namedtuple("RenderContext", ["values", "kind", "key_path", "list_index", "template_key_path", "resolver", "model"], defaults=(None, (), (), (), None, None))):
+    # Immutable render state shared by walk_keys, the renderer and helper functions.
+    # key_path and template_key_path are tuples of key segments ("assets", "[]", "services", ...),
+    # list_index holds the index of each "[]" along key_path ("*" for a whole list).
+    # values is the merged values tree; it is shared and must be treated as read-only.
+    # model is the typed view of the product and assets, with the catalog-wide lookups (see CatalogModel).
+    __slots__ = ()
+
+    @classmethod
+    def for_values(cls, values):
+        resolver = ValueResolver(values)
+        return cls(values, resolver=resolver, model=CatalogModel(values, resolver))
+
+    def at_key(self, current_key):
+        return self._replace(key_path=tuple(current_key.split(".")))
+
+    def at_index(self, index):
+        return self._replace(list_index=self.list_index + (index,))
+
+    def at_template_key(self, key):
+        return self._replace(template_key_path=self.template_key_path + (key,))
+
+    def with_kind(self, kind):
+        return self._replace(kind=kind)
+
+    def lookup(self, path):
+        # Resolve a dotted path or key tuple against values using this context's index vector
+        return self.resolver.get(path, self.list_index)
+
+    @property
+    def node(self):
+        # The catalog node (Asset, Service, Plan, ...) being rendered, see CatalogModel.node_at
+        return self.model.node_at(self.key_path, self.list_index)
@@ -0,0 +1,188 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from itertools import count
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-memory stand-in for the Central API resource endpoints and the OAuth token endpoint, to run
+# central_apply.py locally:
+#   python stub_central.py --port 8080
+#   TOKEN_URL=http://127.0.0.1:8080/token CLIENT_ID=x CLIENT_SECRET=x CENTRAL_URL=http://127.0.0.1:8080 \
+#       python central_apply.py apply -i ../out_yaml
+# Like Central, it rejects resources whose scope does not exist, names nameless resources itself, only deletes
+# archived assets/products/plans and deletes scoped resources with their scope.
+
+# Scopes that live outside the catalog and are assumed to exist
+EXTERNAL_PLURALS = ("environments", "marketplaces", "apiserviceinstances")
+SUBRESOURCE_NAMES = ("state", "lifecycle", "icon")
+# Resources that must be archived before they can be deleted
+ARCHIVED_PLURALS = ("assets", "products", "productplans")
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.ids = count(1)
+        self.requests = {}
+
+    def count(self, method):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+
+def parse_path(path):
+    # -> (group, version, scope plural, scope name, plural, name, subresource) or None
+    parts = [part for part in path.split("/") if part]
+    if len(parts) < 4 or parts[0] != "apis":
+        return None
+    group, version, rest = parts[1], parts[2], parts[3:]
+    subresource = None
+    if len(rest) in (3, 5) and rest[-1] in SUBRESOURCE_NAMES:
+        subresource = rest.pop()
+    scope_plural = scope_name = name = None
+    if len(rest) >= 3:
+        scope_plural, scope_name, rest = rest[0], rest[1], rest[2:]
+    plural = rest[0]
+    if len(rest) > 1:
+        name = rest[1]
+    return group, version, scope_plural, scope_name, plural, name, subresource
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        content = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _route(self, method):
+        self.store.count(method)
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlparse(self.path).path
+        if method == "POST" and path == "/token":
+            # Form-encoded client credentials; any are accepted
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            return self._send(200, {"access_token": "stub-token", "expires_in": 3600})
+        parsed = parse_path(path)
+        if parsed is None:
+            return self._send(404, {"errors": [{"detail": f"Unknown path {path}"}]})
+        return getattr(self, f"_{method.lower()}")(*parsed)
+
+    def _scope_exists(self, group, scope_plural, scope_name):
+        if scope_plural is None or scope_plural in EXTERNAL_PLURALS:
+            return True
+        return (group, None, None, scope_plural, scope_name) in self.store.resources
+
+    def _post(self, group, version, scope_plural, scope_name, plural, name, subresource):
+        body = self._body()
+        with self.store.lock:
+            if name is not None or subresource is not None:
+                return self._send(405)
+            if not self._scope_exists(group, scope_plural, scope_name):
+                return self._send(404, {"errors": [{"detail": f"Scope {scope_plural}/{scope_name} not found"}]})
+            name = body.get("name") or f"{plural[:-1]}-{next(self.store.ids)}"
+            key = (group, scope_plural, scope_name, plural, name)
+            if key in self.store.resources:
+                return self._send(409, {"errors": [{"detail": f"{plural}/{name} already exists"}]})
+            self.store.resources[key] = dict(body, name=name)
+            return self._send(201, self.store.resources[key])
+
+    def _put(self, group, version, scope_plural, scope_name, plural, name, subresource):
+        body = self._body()
+        key = (group, scope_plural, scope_name, plural, name)
+        with self.store.lock:
+            if key not in self.store.resources:
+                if not (subresource and plural in EXTERNAL_PLURALS):
+                    return self._send(404, {"errors": [{"detail": f"{plural}/{name} not found"}]})
+                self.store.resources[key] = {"name": name}
+            if subresource:
+                self.store.resources[key][subresource] = body.get(subresource)
+            else:
+                # Subresources are not changed by a resource update
+                current = self.store.resources[key]
+                self.store.resources[key] = dict(body, name=name, **{s: current[s] for s in SUBRESOURCE_NAMES if s in current})
+            return self._send(200, self.store.resources[key])
+
+    def _get(self, group, version, scope_plural, scope_name, plural, name, subresource):
+        with self.store.lock:
+            if name is None:
+                return self._send(
+                    200,
+                    [
+                        resource
+                        for (g, sp, sn, p, n), resource in self.store.resources.items()
+                        if (g, sp, sn, p) == (group, scope_plural, scope_name, plural)
+                    ],
+                )
+            resource = self.store.resources.get((group, scope_plural, scope_name, plural, name))
+            return self._send(200, resource) if resource is not None else self._send(404)
+
+    def _delete(self, group, version, scope_plural, scope_name, plural, name, subresource):
+        key = (group, scope_plural, scope_name, plural, name)
+        with self.store.lock:
+            resource = self.store.resources.get(key)
+            if resource is None:
+                return self._send(404)
+            if plural in ARCHIVED_PLURALS and resource.get("state") != "archived":
+                return self._send(409, {"errors": [{"detail": f"{plural}/{name} must be archived before it is deleted"}]})
+            del self.store.resources[key]
+            for scoped in [k for k in self.store.resources if (k[0], k[1], k[2]) == (group, plural, name)]:
+                del self.store.resources[scoped]
+            return self._send(204)
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+def start_server(port=0, latency=0.0):
+    # Serves in a background thread; returns (server, store). port=0 picks a free port (server.server_port).
+    store = Store()
+    handler = type("StubHandler", (Handler,), {"store": store, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an in-memory Central API stub for central_apply.py.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request, to mimic a remote API")
+    args = parser.parse_args()
+
+    server, store = start_server(args.port, args.latency)
+    url = f"http://127.0.0.1:{server.server_port}"
+    print(f"Central API stub listening on {url}")
+    print(f"  export TOKEN_URL={url}/token CLIENT_ID=stub CLIENT_SECRET=stub CENTRAL_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"Requests served: {store.requests}")
+        sys.exit(0)
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+
+import utils as u
+from yaml_utils import ordered_dump
+from team_index import TEAM_DATA_FILE
+from fetch_team_ids import fetch_team_page, iter_teams, TEAM_PAGE_SIZE
+
+# Syncs the org's teams into data/central-teams.yaml (teams: [{id, name}], as read by team_index).
+# The ETag / Last-Modified of every page of the last sync is kept next to the teams file, so an unchanged org
+# costs one conditional request per page.
+
+
+def marker_path(teams_file):
+    folder, name = os.path.split(teams_file)
+    return os.path.join(folder, f".{os.path.splitext(name)[0]}.sync.json")
+
+
+def _digest_file(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_marker(teams_file):
+    # The marker only counts while the teams file is exactly what the last sync wrote
+    path = marker_path(teams_file)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return marker if marker.get("digest") == _digest_file(teams_file) else {}
+
+
+def _conditional_headers(page):
+    headers = {}
+    if page.get("etag"):
+        headers["If-None-Match"] = page["etag"]
+    if page.get("last_modified"):
+        headers["If-Modified-Since"] = page["last_modified"]
+    return headers
+
+
+def _revalidate(marker, page_size):
+    # Returns (unchanged, first page response to reuse). Every page of the last sync is revalidated: when all of
+    # them answer 304 the listing ends at the same page with the same teams (a team added after the last one
+    # changes the last page); a page without validators or fetched with another page size counts as changed.
+    pages = marker.get("pages")
+    if not pages or marker.get("page_size") != page_size:
+        return False, None
+    for page in pages:
+        headers = _conditional_headers(page)
+        if not headers:
+            return False, None
+        response = fetch_team_page(page["offset"], page_size, headers=headers)
+        if response.status_code != 304:
+            return False, response if page["offset"] == 0 else None
+    return True, None
+
+
+def write_teams(stream, teams, batch_size=TEAM_PAGE_SIZE):
+    # Streams the teams as they arrive; the output is identical to ordered_dump({"teams": [...]})
+    count, batch = 0, []
+
+    def write_batch():
+        text = ordered_dump([{"id": team.get("guid"), "name": team.get("name")} for team in batch], default_flow_style=False)
+        stream.write("".join(f"  {line}" for line in text.splitlines(keepends=True)))
+        batch.clear()
+
+    for team in teams:
+        if not count:
+            stream.write("teams:\n")
+        count += 1
+        batch.append(team)
+        if len(batch) >= batch_size:
+            write_batch()
+    if batch:
+        write_batch()
+    if not count:
+        stream.write("teams: []\n")
+    return count
+
+
+def sync_teams(teams_file=TEAM_DATA_FILE, page_size=TEAM_PAGE_SIZE, force=False):
+    # Returns the number of teams written, or None when the org's teams did not change since the last sync
+    unchanged, first_page = _revalidate({} if force else _load_marker(teams_file), page_size)
+    if unchanged:
+        return None
+
+    pages = []
+
+    def record_page(offset, response):
+        pages.append({"offset": offset, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")})
+
+    os.makedirs(os.path.dirname(teams_file) or ".", exist_ok=True)
+    with u.open_atomic(teams_file) as f:
+        count = write_teams(f, iter_teams(page_size, first_response=first_page, on_page=record_page), page_size)
+
+    marker = {
+        "page_size": page_size,
+        "pages": pages,
+        "teams": count,
+        "digest": _digest_file(teams_file),
+        "synced_at": datetime.now(timezone.utc).isoformat(),
+    }
+    u.write_file_atomic(marker_path(teams_file), json.dumps(marker, indent=2))
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the org's teams into the team data file used by map_yaml_2_yaml.py.")
+    parser.add_argument("-o", "--output", default=TEAM_DATA_FILE, help=f"Teams file to write (default: {TEAM_DATA_FILE})")
+    parser.add_argument("--page-size", type=int, default=TEAM_PAGE_SIZE, help=f"Teams requested per page (default: {TEAM_PAGE_SIZE})")
+    parser.add_argument("--force", action="store_true", help="Ignore the last sync marker and always download every team")
+    args = parser.parse_args()
+
+    try:
+        count = sync_teams(args.output, args.page_size, args.force)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    if count is None:
+        print(f"Teams unchanged since the last sync, '{args.output}' left as is")
+    else:
+        print(f"Synced {count} team(s) into '{args.output}'")
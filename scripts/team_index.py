@@ -0,0 +1,79 @@
+import os
+from collections import OrderedDict
+
+import yaml
+
+from logger_config import logger
+from yaml_utils import SafeLoader
+
+TEAM_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "central-teams.yaml")
+
+
+def normalize_team_name(name):
+    # Team names match case-insensitively and ignoring surrounding/repeated whitespace
+    return " ".join(str(name).split()).casefold()
+
+
+class TeamIndex:
+    # name -> id and id -> name hash indexes over the teams listed in central-teams.yaml
+    def __init__(self, teams, source=None):
+        self.source = source
+        self.id_by_name = {}
+        self.name_by_id = {}
+        self.misses = OrderedDict()
+        for team in teams:
+            name, team_id = team.get("name"), team.get("id")
+            if name is None or team_id is None:
+                continue
+            # First entry wins, as with the previous linear scan
+            self.id_by_name.setdefault(normalize_team_name(name), team_id)
+            self.name_by_id.setdefault(team_id, name)
+
+    def __len__(self):
+        return len(self.id_by_name)
+
+    def id_for(self, name):
+        if name is None:
+            return None
+        team_id = self.id_by_name.get(normalize_team_name(name))
+        if team_id is None:
+            self.misses[name] = self.misses.get(name, 0) + 1
+        return team_id
+
+    def name_for(self, team_id):
+        return self.name_by_id.get(team_id)
+
+    def report_misses(self):
+        if self.misses:
+            missing = ", ".join(f"'{name}' ({count}x)" for name, count in self.misses.items())
+            logger.warning(f"{len(self.misses)} team name(s) not found in {self.source} ({len(self)} teams indexed): {missing}")
+        self.misses.clear()
+
+
+def load_team_index(team_file_path):
+    if not os.path.exists(team_file_path):
+        raise FileNotFoundError(f"Team data file not found: {team_file_path}")
+    with open(team_file_path, "r") as file:
+        teams = (yaml.load(file, Loader=SafeLoader) or {}).get("teams", []) or []
+    return TeamIndex(teams, source=team_file_path)
+
+
+# One index per team file per process, shared by every helper module instance
+_TEAM_INDEXES = {}
+
+
+def get_team_index(team_file_path):
+    index = _TEAM_INDEXES.get(team_file_path)
+    if index is None:
+        index = _TEAM_INDEXES[team_file_path] = load_team_index(team_file_path)
+    return index
+
+
+def report_misses():
+    for index in _TEAM_INDEXES.values():
+        index.report_misses()
+
+
+def forget_team_index(team_file_path):
+    # The next get_team_index reads the (changed) team file again
+    _TEAM_INDEXES.pop(team_file_path, None)
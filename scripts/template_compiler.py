@@ -0,0 +1,145 @@
+import re
+from collections import OrderedDict
+
+import yaml_utils as y
+
+# {{func.name}} or {{func.name(param, ...)}}
+FUNCTION_PATTERN = re.compile(r"{{func\.([^()}]+?)(?:\((.*?)\))?}}")
+PLACEHOLDER_PATTERN = re.compile(r"{{(.*?)}}", re.DOTALL)
+
+# Helpers whose list/dict result replaces the whole scalar instead of being inlined
+STRUCTURED_RESULT_HELPERS = ("lookup_teams_ids", "get_asset_name_list", "get_asset_resources")
+
+# Placeholders whose rendered string is emitted as a folded scalar
+FOLDED_PLACEHOLDERS = ("supportContact.microsoftTeams.url",)
+
+
+class PathRef:
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+
+class HelperCall:
+    __slots__ = ("name", "params", "raw")
+
+    def __init__(self, name, params, raw):
+        self.name = name
+        self.params = params
+        self.raw = raw
+
+
+class Text:
+    # A string scalar split into literal segments, path lookups and helper calls
+    __slots__ = ("segments", "helpers", "paths", "folded")
+
+    def __init__(self, segments):
+        self.segments = tuple(segments)
+        self.helpers = tuple(s for s in self.segments if isinstance(s, HelperCall))
+        self.paths = tuple(OrderedDict.fromkeys(s.path for s in self.segments if isinstance(s, PathRef)))
+        self.folded = any(p in FOLDED_PLACEHOLDERS for p in self.paths)
+
+
+class Mapping:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = tuple(items)
+
+
+class Sequence:
+    # Only the first item of a template list is rendered (matches the original renderer)
+    __slots__ = ("first",)
+
+    def __init__(self, first):
+        self.first = first
+
+
+class Constant:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Program:
+    __slots__ = ("kind", "root", "file_name")
+
+    def __init__(self, kind, root, file_name):
+        self.kind = kind
+        self.root = root
+        self.file_name = file_name
+
+
+def compile_text(text):
+    if "{{" not in text or "}}" not in text:
+        return Constant(text)
+
+    segments = []
+    pos = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.start() > pos:
+            segments.append(text[pos : match.start()])
+        function_match = FUNCTION_PATTERN.fullmatch(match.group(0))
+        if function_match:
+            name, params_str = function_match.group(1), function_match.group(2)
+            params = tuple(p.strip().strip("\"'") for p in params_str.split(",")) if params_str else ()
+            raw = f"{name}({params_str})" if params_str else name
+            segments.append(HelperCall(name, params, raw))
+        else:
+            segments.append(PathRef(match.group(1).strip()))
+        pos = match.end()
+    if pos < len(text):
+        segments.append(text[pos:])
+    return Text(segments)
+
+
+def compile_node(node):
+    if isinstance(node, dict):
+        return Mapping((k, compile_node(v)) for k, v in node.items())
+    elif isinstance(node, list):
+        return Sequence(compile_node(node[0]) if node else None)
+    elif isinstance(node, str):
+        return compile_text(node)
+    return Constant(node)
+
+
+def compile_template(template, file_name=None):
+    return Program(template.get("kind", None), compile_node(template), file_name)
+
+
+def iter_text_nodes(node):
+    if isinstance(node, Text):
+        yield node
+    elif isinstance(node, Mapping):
+        for _, child in node.items:
+            yield from iter_text_nodes(child)
+    elif isinstance(node, Sequence) and node.first is not None:
+        yield from iter_text_nodes(node.first)
+
+
+def iter_placeholders(program):
+    for text in iter_text_nodes(program.root):
+        for segment in text.segments:
+            if not isinstance(segment, str):
+                yield segment
+
+
+def path_exists(values, path):
+    return bool(y.collect_by_path(values, [k for k in path.split(".") if k != "[]"]))
+
+
+def find_unresolved(program, values, helper_functions):
+    # Placeholders that cannot resolve for any item: unknown helpers and value paths missing from the values tree
+    unresolved = []
+    for placeholder in iter_placeholders(program):
+        if isinstance(placeholder, HelperCall):
+            if not callable(helper_functions.get(placeholder.name)):
+                unresolved.append(f"func.{placeholder.raw}")
+            for param in placeholder.params:
+                if not path_exists(values, param):
+                    unresolved.append(param)
+        elif not path_exists(values, placeholder.path):
+            unresolved.append(placeholder.path)
+    return list(OrderedDict.fromkeys(unresolved))
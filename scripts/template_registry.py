@@ -0,0 +1,93 @@
+import os
+import hashlib
+
+import utils as u
+import yaml_utils as y
+import template_compiler as tc
+
+
+class TemplateEntry:
+    __slots__ = ("path", "mtime_ns", "size", "digest", "program")
+
+    def __init__(self, path, mtime_ns, size, digest, program):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.program = program
+
+
+class TemplateRegistry:
+    # Loads and compiles every template in KEY_TO_TEMPLATE_MAP once; refresh() revalidates by mtime, then content hash
+    def __init__(self, input_folder, key_map=None):
+        self.input_folder = input_folder
+        self.key_map = key_map if key_map is not None else u.KEY_TO_TEMPLATE_MAP
+        self._entries = {}
+        # template key -> (mtime_ns, size) of a file that failed to load, not retried until it changes
+        self._failed = {}
+        self.refresh()
+
+    def get(self, template_key):
+        entry = self._entries.get(template_key)
+        return entry.program if entry else None
+
+    def items(self):
+        return ((template_key, entry.program) for template_key, entry in self._entries.items())
+
+    def digest(self, template_key):
+        entry = self._entries.get(template_key)
+        return entry.digest if entry else None
+
+    def refresh(self, errors=None):
+        # Returns the template keys whose compiled program changed (added, modified or removed).
+        # Without an errors list, a template that fails to load raises; with one, (template key, error) is
+        # appended, the last good program is kept and the file is tried again once it changes.
+        changed = []
+        for template_key, file_name in self.key_map.items():
+            path = os.path.join(self.input_folder, file_name)
+            entry = self._entries.get(template_key)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._failed.pop(template_key, None)
+                if self._entries.pop(template_key, None) is not None:
+                    changed.append(template_key)
+                continue
+
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                continue
+            if self._failed.get(template_key) == (stat.st_mtime_ns, stat.st_size):
+                continue
+
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()
+            self._failed.pop(template_key, None)
+            if entry and entry.digest == digest:
+                # Touched but unchanged (or changed back): keep the compiled program
+                entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+                continue
+
+            try:
+                template = y.load_yaml_documents(content.decode("utf-8"), path)
+                program = tc.compile_template(template, path)
+            except Exception as e:
+                if errors is None:
+                    raise
+                self._failed[template_key] = (stat.st_mtime_ns, stat.st_size)
+                errors.append((template_key, e))
+                continue
+            self._entries[template_key] = TemplateEntry(path, stat.st_mtime_ns, stat.st_size, digest, program)
+            changed.append(template_key)
+        return changed
+
+
+_REGISTRIES = {}
+
+
+def get_registry(input_folder):
+    # One registry per template folder per process
+    registry = _REGISTRIES.get(input_folder)
+    if registry is None:
+        registry = _REGISTRIES[input_folder] = TemplateRegistry(input_folder)
+    return registry
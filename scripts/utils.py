@@ -1,4 +1,6 @@
+import os
 import re
+from contextlib import contextmanager
 
 KEY_TO_KIND_MAP = {
     "product": "Product",
@@ -30,6 +32,21 @@ KEY_TO_TEMPLATE_MAP = {
 }
 
 
+# Root folder for caches that persist across runs (icon encodings, ...)
+CACHE_DIR = os.getenv("MARKETPLACE_CACHE_DIR", "./.cache")
+
+
+def cache_dir(*parts):
+    return os.path.join(CACHE_DIR, *parts)
+
+
+def user_cache_dir(*parts):
+    # Per-user folder ($XDG_CACHE_HOME/marketplace, default ~/.cache/marketplace) for caches that are read back
+    # as data and must not depend on the working directory
+    root = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "marketplace", *parts)
+
+
 def get_template_filename(key_path, data=None):
     # if key_path == "product.documentation" and data.get("defaults", False):
     #     return KEY_TO_KIND_MAP.get(key_path)
@@ -80,3 +97,23 @@ def is_yaml_primitive(value):
         return False
     # For any unexpected type, return False
     return False
+
+
+@contextmanager
+def open_atomic(path, mode="w"):
+    # Yields a temporary file next to path that is renamed over path once the block succeeds,
+    # so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_file_atomic(path, content):
+    with open_atomic(path, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
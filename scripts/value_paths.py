@@ -0,0 +1,70 @@
+from functools import lru_cache
+from contextlib import contextmanager
+
+# "[]" in a dotted path selects the list item given by the next entry of the index vector;
+# an index of "*" selects the whole list instead of one item.
+WILDCARD = "[]"
+WHOLE_LIST = "*"
+
+
+class ValuePath:
+    __slots__ = ("keys", "wildcards")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.wildcards = keys.count(WILDCARD)
+
+    def resolve(self, values, list_index=()):
+        v = values
+        indexes = iter(list_index)
+        for k in self.keys:
+            if k == WILDCARD:
+                if not isinstance(v, list):
+                    return None
+                index = next(indexes, None)
+                if index == WHOLE_LIST:
+                    continue
+                if index is None or index >= len(v):
+                    return None
+                v = v[index]
+            elif isinstance(v, dict) and k in v:
+                v = v[k]
+            else:
+                return None
+        return v
+
+
+@lru_cache(maxsize=None)
+def compile_path(path):
+    # Accepts a dotted path ("assets.[].services.[].name") or a tuple of keys
+    return ValuePath(tuple(path.split(".")) if isinstance(path, str) else tuple(path))
+
+
+class ValueResolver:
+    # Resolves value paths against a read-only values tree, memoizing results per (path, index vector) for the run
+    def __init__(self, values):
+        self.values = values
+        self._memo = {}
+        # When set, every (keys, index vector) looked up is added here (see record_reads)
+        self.reads = None
+
+    def get(self, path, list_index=()):
+        accessor = compile_path(path)
+        # Only the indexes consumed by the path's wildcards take part in the memo key
+        key = (accessor.keys, tuple(list_index[: accessor.wildcards]))
+        if self.reads is not None:
+            self.reads.add(key)
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = accessor.resolve(self.values, key[1])
+            return value
+
+    @contextmanager
+    def record_reads(self):
+        # Collect the value paths resolved while the block runs (nested recordings are not supported)
+        self.reads = reads = set()
+        try:
+            yield reads
+        finally:
+            self.reads = None
@@ -1,9 +1,12 @@
+import io
 import yaml
+import hashlib
 from copy import deepcopy
 from glob import glob
 import os
 from collections import OrderedDict
-import base64
+from icon_cache import get_icon_cache
+from parse_cache import get_parse_cache
 from yaml.dumper import SafeDumper
 
 
@@ -15,33 +18,104 @@ def folded_scalar_representer(dumper, data):
     return dumper.represent_scalar("tag:yaml.org,2002:str", data, style=">")
 
 
-def update_icon_in_yaml(data, image_path):
-    # Read the image and base64-encode it
-    with open(image_path, "rb") as f:
-        encoded_str = base64.b64encode(f.read()).decode("utf-8")
-
-    # Construct the data URI
-    data_uri = f"data:image/png;base64,{encoded_str}"
+def update_icon_in_yaml(data, image_path, icon_cache=None):
+    # Each image is read and base64-encoded once; later documents reuse the cached data URI
+    data_uri = (icon_cache or get_icon_cache()).data_uri(image_path)
     data["icon"] = FoldedScalarString(data_uri)
 
 
-def ordered_dump(data, stream=None, Dumper=yaml.SafeDumper, **kwds):
-    Dumper.add_representer(FoldedScalarString, folded_scalar_representer)
+def _dict_representer(dumper, data):
+    return dumper.represent_mapping(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, data.items())
+
+
+def _list_representer(dumper, data):
+    return dumper.represent_sequence(yaml.resolver.BaseResolver.DEFAULT_SEQUENCE_TAG, data, flow_style=False)
+
+
+# Scalars at least this long (icon data URIs) are analyzed and folded once per process; the emitter then
+# writes the cached text and state, so the output stays byte-identical
+CACHED_SCALAR_LENGTH = 1024
+CACHED_SCALAR_LIMIT = 64
+_SCALAR_ANALYSES = {}
+_FOLDED_BLOCKS = {}
+
+
+def _cache_put(cache, key, value):
+    if len(cache) >= CACHED_SCALAR_LIMIT:
+        cache.clear()
+    cache[key] = value
+    return value
+
+
+def _scalar_digest(text):
+    # Cache keys hold a digest of the scalar, not the scalar itself
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def clear_scalar_caches():
+    _SCALAR_ANALYSES.clear()
+    _FOLDED_BLOCKS.clear()
+
+
+class CachedScalarEmitterMixin:
+    # libyaml's emitter cannot keep block sequences indented inside mappings (increase_indent below), so dumps
+    # stay on the Python emitter and skip its per-character work on long scalars instead
+
+    def analyze_scalar(self, scalar):
+        if len(scalar) < CACHED_SCALAR_LENGTH:
+            return super().analyze_scalar(scalar)
+        key = (_scalar_digest(scalar), self.allow_unicode)
+        analysis = _SCALAR_ANALYSES.get(key)
+        return analysis if analysis is not None else _cache_put(_SCALAR_ANALYSES, key, super().analyze_scalar(scalar))
+
+    def write_folded(self, text):
+        if len(text) < CACHED_SCALAR_LENGTH or self.encoding:
+            return super().write_folded(text)
+        # Everything the folded output depends on, and the state it leaves behind
+        key = (_scalar_digest(text), self.column, self.indent, self.best_width, self.best_line_break, self.whitespace, self.indention, self.open_ended)
+        block = _FOLDED_BLOCKS.get(key)
+        if block is None:
+            stream, line = self.stream, self.line
+            self.stream = io.StringIO()
+            try:
+                super().write_folded(text)
+                written = self.stream.getvalue()
+            finally:
+                self.stream = stream
+            block = _cache_put(_FOLDED_BLOCKS, key, (written, self.line - line, self.column, self.whitespace, self.indention, self.open_ended))
+        else:
+            written, lines, self.column, self.whitespace, self.indention, self.open_ended = block
+            self.line += lines
+        self.stream.write(written)
+
+
+# One ordered dumper class per base Dumper, built on first use and reused for every dump
+_ORDERED_DUMPERS = {}
+
 
-    class OrderedDumper(Dumper):
+def get_ordered_dumper(Dumper=yaml.SafeDumper, cache_scalars=True):
+    # cache_scalars=False gives the plain PyYAML emitter, the reference the cached one is checked against
+    OrderedDumper = _ORDERED_DUMPERS.get((Dumper, cache_scalars))
+    if OrderedDumper is None:
 
-        def increase_indent(self, flow=False, indentless=False):
-            return super(OrderedDumper, self).increase_indent(flow, False)
+        class OrderedDumper(*((CachedScalarEmitterMixin,) if cache_scalars else ()), Dumper):
 
-    def _dict_representer(dumper, data):
-        return dumper.represent_mapping(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, data.items())
+            def increase_indent(self, flow=False, indentless=False):
+                return super(OrderedDumper, self).increase_indent(flow, False)
 
-    def _list_representer(dumper, data):
-        return dumper.represent_sequence(yaml.resolver.BaseResolver.DEFAULT_SEQUENCE_TAG, data, flow_style=False)
+            # Rendered documents may share subtrees with the values tree; never emit anchors/aliases
+            def ignore_aliases(self, data):
+                return True
 
-    OrderedDumper.add_representer(OrderedDict, _dict_representer)
-    OrderedDumper.add_representer(list, _list_representer)
-    return yaml.dump(data, stream, OrderedDumper, **kwds)
+        OrderedDumper.add_representer(FoldedScalarString, folded_scalar_representer)
+        OrderedDumper.add_representer(OrderedDict, _dict_representer)
+        OrderedDumper.add_representer(list, _list_representer)
+        _ORDERED_DUMPERS[(Dumper, cache_scalars)] = OrderedDumper
+    return OrderedDumper
+
+
+def ordered_dump(data, stream=None, Dumper=yaml.SafeDumper, cache_scalars=True, **kwds):
+    return yaml.dump(data, stream, get_ordered_dumper(Dumper, cache_scalars), **kwds)
 
 
 class DuplicateKeyError(Exception):
@@ -59,14 +133,36 @@ def check_duplicate_keys(loader, node, deep=False):
     return mapping
 
 
-# Register the custom constructor with the default YAML SafeLoader
-class OrderedLoader(yaml.SafeLoader):
+# libyaml's scanner/parser when PyYAML was built with it, the pure-Python one otherwise; documents are
+# constructed in Python either way, so ordering and duplicate-key checks are the same
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+# Register the custom constructor with the SafeLoader
+class OrderedLoader(SafeLoader):
     pass
 
 
 yaml.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, check_duplicate_keys, Loader=OrderedLoader)
 
 
+def named_stream(text, file_path):
+    # The loaders take the name of a stream for their error marks: 'in "<file_path>", line 3', not "<unicode string>"
+    stream = io.StringIO(text)
+    stream.name = file_path
+    return stream
+
+
+def parse_yaml_file(file_path):
+    # All documents of a YAML file, from the parse cache when the same content was parsed before
+    return get_parse_cache().load(file_path, OrderedLoader, lambda text: list(yaml.load_all(named_stream(text, file_path), Loader=OrderedLoader)))
+
+
+def _parsed_documents(file_path):
+    # Lazy, so that parse errors surface where the documents are consumed
+    yield from parse_yaml_file(file_path)
+
+
 def load_and_validate_yaml(filenames):
     yaml_files = []
 
@@ -83,16 +179,28 @@ def load_and_validate_yaml(filenames):
 
     combined_data = OrderedDict()
     for file_path in yaml_files:
-        with open(file_path, "r") as f:
-            try:
-                for doc in yaml.load_all(f, Loader=OrderedLoader):
-                    for key, value in doc.items():
-                        if key in combined_data:
-                            raise DuplicateKeyError(f"Duplicate key '{key}' found across documents.")
-                        combined_data[key] = value
-            except DuplicateKeyError as e:
-                print(f"Error in file {file_path}: {e}")
-                raise
+        combine_documents(_parsed_documents(file_path), file_path, combined_data)
+    return combined_data
+
+
+def load_yaml_documents(stream, file_path, combined_data=None):
+    if isinstance(stream, str):
+        stream = named_stream(stream, file_path)
+    return combine_documents(yaml.load_all(stream, Loader=OrderedLoader), file_path, combined_data)
+
+
+def combine_documents(documents, file_path, combined_data=None):
+    if combined_data is None:
+        combined_data = OrderedDict()
+    try:
+        for doc in documents:
+            for key, value in doc.items():
+                if key in combined_data:
+                    raise DuplicateKeyError(f"Duplicate key '{key}' found across documents.")
+                combined_data[key] = value
+    except DuplicateKeyError as e:
+        print(f"Error in file {file_path}: {e}")
+        raise
     return combined_data
 
 
@@ -131,8 +239,9 @@ def get_by_path(d, path):
 
 
 def collect_distinct_by_path(data, keys):
+    # Distinct values in first-seen order, so output does not depend on set iteration order
     values = collect_by_path(data, keys)
-    return list(set(values))
+    return list(OrderedDict.fromkeys(values))
 
 
 def collect_by_path(data, keys):
@@ -190,31 +299,65 @@ def set_by_path(d, path, value):
     return d
 
 
-def deep_merge(source, destination):
+# Lists of mappings merged item by item on an identity key instead of by position, by values path; used when every
+# item of both lists carries the key (unique within each list), so unnamed plans are still merged by position
+MERGE_KEYS = {
+    "assets": "name",
+    "product.plans": "name",
+    "product.plans.quotas": "name",
+    "product.documentation.sections": "name",
+}
+
+
+def _merge_key(source, destination, path):
+    key = MERGE_KEYS.get(path)
+    if key is None or not source or not destination:
+        return None
+    for items in (source, destination):
+        identities = [item.get(key) if isinstance(item, dict) else None for item in items]
+        if any(identity is None or isinstance(identity, (dict, list)) for identity in identities) or len(set(identities)) < len(identities):
+            return None
+    return key
+
+
+def deep_merge(source, destination, path=""):
+    # Fills in destination (the values) from source (the defaults); destination wins on conflicts. Neither input
+    # is modified: only containers both sides contribute to are new, every other subtree is shared with the inputs
     if isinstance(source, dict) and isinstance(destination, dict):
+        merged = None
         for key, value in source.items():
             if key in destination:
-                destination[key] = deep_merge(value, destination[key])
-            else:
-                destination[key] = deepcopy(value)
-        return destination
+                current = destination[key]
+                value = deep_merge(value, current, f"{path}.{key}" if path else key)
+                if value is current:
+                    continue
+            if merged is None:
+                merged = destination.copy()
+            merged[key] = value
+        return destination if merged is None else merged
 
     elif isinstance(source, list) and isinstance(destination, list):
+        if key := _merge_key(source, destination, path):
+            # Destination order, then the source items it does not name
+            by_key = {item[key]: item for item in source}
+            result = [deep_merge(by_key.pop(item[key]), item, path) if item[key] in by_key else item for item in destination]
+            return result + list(by_key.values())
+
         result = []
         # Merge elements at matching indices
         for i in range(max(len(source), len(destination))):
             if i < len(destination) and i < len(source):
                 if isinstance(destination[i], (dict, list)):
-                    result.append(deep_merge(source[i], deepcopy(destination[i])))
+                    result.append(deep_merge(source[i], destination[i], path))
                 else:
                     result.append(destination[i])
             elif i < len(source):
-                result.append(deepcopy(source[i]))
+                result.append(source[i])
             else:
-                result.append(deepcopy(destination[i]))
+                result.append(destination[i])
         return result
 
-    return destination if destination is not None else deepcopy(source)
+    return destination if destination is not None else source
 
 
 def merge_yaml_files(defaults_path, params_path, output_path=None):